@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+import period_returns
+
+
+@dataclass(frozen=True)
+class AlignedReturns:
+    """Several level series (funds, benchmarks) on one shared calendar.
+
+    `levels` is (dates x series) and `returns` holds the simple daily
+    returns between consecutive calendar dates, so returns[i] is the
+    return into dates[i + 1]. Both are column-major, making every series a
+    contiguous float64 view; windows slice rows and copy nothing.
+    """
+    dates: np.ndarray
+    levels: np.ndarray
+    returns: np.ndarray
+    keys: tuple
+
+    def __len__(self):
+        return len(self.dates)
+
+    def column(self, key):
+        return self.keys.index(key)
+
+    def level(self, key):
+        return self.levels[:, self.column(key)]
+
+    def returns_of(self, key):
+        return self.returns[:, self.column(key)]
+
+    def trailing(self, days=None):
+        """The last `days` calendar days (everything if None)."""
+        if not days or len(self.dates) == 0:
+            return self
+        lo = period_returns.window_start(self.dates, days)
+        return AlignedReturns(self.dates[lo:], self.levels[lo:], self.returns[lo:], self.keys)
+
+    def return_series(self, key):
+        """Daily returns of one series as a pandas Series, for libraries that want one."""
+        return pd.Series(
+            self.returns_of(key), index=pd.DatetimeIndex(self.dates[1:].astype('datetime64[ns]'), name='date'),
+            name=key, copy=False
+        )
+
+
+def _as_dates(dates):
+    return np.asarray(dates).astype('datetime64[D]')
+
+
+def align(series, calendar='common'):
+    """Align {key: (dates, values)} of sorted, unique dates onto one calendar.
+
+    calendar='common' keeps only the dates every series has, which is how
+    fund and benchmark are compared. calendar='union' keeps every date and
+    forward-fills each series between its first and last value, leaving it
+    NaN outside that range, which suits comparing funds of different ages.
+    """
+    keys = tuple(series)
+    all_dates = [_as_dates(series[k][0]) for k in keys]
+    if not keys:
+        dates = np.empty(0, dtype='datetime64[D]')
+    elif calendar == 'common':
+        dates = reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), all_dates)
+    elif calendar == 'union':
+        dates = np.unique(np.concatenate(all_dates))
+    else:
+        raise ValueError(f"Unknown calendar {calendar!r}")
+
+    levels = np.full((len(dates), len(keys)), np.nan, order='F')
+    for col, key in enumerate(keys):
+        own_dates, values = all_dates[col], np.asarray(series[key][1], dtype=np.float64)
+        if len(own_dates) == 0:
+            continue
+        if calendar == 'common':
+            levels[:, col] = values[np.searchsorted(own_dates, dates)]
+            continue
+        rows = np.searchsorted(dates, own_dates)
+        first, last = rows[0], rows[-1]
+        # Forward-fill by pointing every row at the latest observation at or before it
+        source = np.searchsorted(rows, np.arange(first, last + 1), side='right') - 1
+        levels[first:last + 1, col] = values[source]
+
+    returns = np.empty((max(len(dates) - 1, 0), len(keys)), order='F')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(levels[1:], levels[:-1], out=returns)
+    returns -= 1
+    return AlignedReturns(dates, levels, returns, keys)
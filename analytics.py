@@ -0,0 +1,166 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import aligned_returns
+import drawdown_episodes
+import instrumentation
+import period_returns
+import rolling_returns
+import rolling_risk
+
+# Rolling return windows shown in the rolling returns tabs
+ROLLING_WINDOWS = ('1M', '3M', '6M', '1Y', '3Y')
+VOLATILITY_WINDOW = '30D'
+TRADING_DAYS = 252
+# Windows of the rolling risk metrics in the volatility tab
+RISK_WINDOWS = ('30D', '3M', '6M', '1Y')
+
+
+def _series_analytics(dates, values, value_col):
+    frame = pd.DataFrame({'date': dates, value_col: values})
+    frame['daily_return'] = frame[value_col].pct_change() * 100
+    # Annualized, from the prefix-sum engine rather than a pandas rolling window
+    volatility = rolling_risk.rolling_risk(
+        frame['daily_return'].to_numpy()[1:] / 100, windows=(VOLATILITY_WINDOW,), metrics=('volatility',)
+    ).get('volatility', VOLATILITY_WINDOW)
+    frame['volatility_30d'] = np.concatenate([[np.nan], volatility])[:len(frame)]
+    frame['running_max'] = frame[value_col].cummax()
+    frame['drawdown'] = ((frame[value_col] / frame['running_max']) - 1) * 100
+    return frame
+
+
+def _trailing_returns(fund):
+    dates = fund['date'].to_numpy()
+    navs = fund['nav'].to_numpy()
+    returns = period_returns.trailing_returns(dates, navs, ('1D', '1W', '1M', '1Y', 'SI'))
+    return {
+        'latest_nav': navs[-1],
+        '1d': returns['1D'] if returns['1D'] is not None else 0,
+        '1w': returns['1W'],
+        '1m': returns['1M'],
+        '1y': returns['1Y'],
+        'total': returns['SI'] if returns['SI'] is not None else 0,
+        'start_date': fund['date'].iloc[0],
+        'end_date': fund['date'].iloc[-1],
+    }
+
+
+@dataclass(frozen=True)
+class FundAnalytics:
+    """Every series and statistic the analysis page shows for one fund.
+
+    Built once per (scheme, benchmark, data version) and shared between
+    reruns and sessions, so the frames must be treated as read-only.
+    """
+    fund: pd.DataFrame
+    benchmark: pd.DataFrame = None
+    period_returns: dict = field(default_factory=dict)
+    rolling: rolling_returns.RollingComparison = None
+    rolling_summary: pd.DataFrame = None
+    avg_volatility: dict = field(default_factory=dict)
+    max_drawdown: dict = field(default_factory=dict)
+    current_drawdown: float = None
+    drawdown_episodes: dict = field(default_factory=dict)
+    # Fund and benchmark on their common dates, shared by every comparison
+    aligned: aligned_returns.AlignedReturns = None
+    # Rolling risk metrics of the fund (column 0) and benchmark (column 1)
+    # on the aligned returns, for RISK_WINDOWS
+    risk: rolling_risk.RollingRisk = None
+
+    @property
+    def has_benchmark(self):
+        return self.benchmark is not None and not self.benchmark.empty
+
+    def window(self, days=None):
+        """Fund and benchmark rows for the trailing `days` (all history if None)."""
+        fund = self.fund[['date', 'nav']]
+        if days:
+            fund = fund.iloc[period_returns.window_start(fund['date'].to_numpy(), days):]
+        if not self.has_benchmark:
+            return fund, None
+        lo, hi = period_returns.window_bounds(
+            self.benchmark['date'].to_numpy(), fund['date'].iloc[0], fund['date'].iloc[-1]
+        )
+        return fund, self.benchmark[['date', 'close']].iloc[lo:hi]
+
+    def risk_series(self, metric, window):
+        """Rolling `metric` over `window` as a frame with 'date', 'fund' and,
+        for metrics not measured against the benchmark, 'benchmark' columns."""
+        columns = {'date': self.aligned.dates[1:][self.risk.rows].astype('datetime64[ns]'),
+                   'fund': self.risk.get(metric, window, 0)}
+        if metric not in rolling_risk.RELATIVE_METRICS:
+            columns['benchmark'] = self.risk.get(metric, window, 1)
+        return pd.DataFrame(columns).dropna(subset=['fund'])
+
+
+def build_analytics(nav_frame, benchmark=None):
+    """Compute the analytics snapshot from a date-indexed NAV frame and an
+    optional benchmark history with 'date' and 'close' columns."""
+    with instrumentation.span("analytics.build", rows=len(nav_frame)):
+        return _build_analytics(nav_frame, benchmark)
+
+
+def _episodes(frame, value_col):
+    with instrumentation.span("analytics.drawdown_episodes"):
+        return drawdown_episodes.find_episodes(frame['date'].to_numpy(), frame[value_col].to_numpy())
+
+
+def _build_analytics(nav_frame, benchmark):
+    with instrumentation.span("analytics.series"):
+        fund = _series_analytics(nav_frame.index.values, nav_frame['nav'].to_numpy(), 'nav')
+
+    if benchmark is not None and not benchmark.empty:
+        lo, hi = period_returns.window_bounds(
+            benchmark['date'].to_numpy(), fund['date'].iloc[0], fund['date'].iloc[-1]
+        )
+        benchmark = benchmark.iloc[lo:hi]
+    if benchmark is None or benchmark.empty:
+        with instrumentation.span("analytics.rolling"):
+            rolling = rolling_returns.compare(fund['date'].to_numpy(), fund['nav'].to_numpy(), windows=ROLLING_WINDOWS)
+            rolling_summary = rolling.summary()
+        return FundAnalytics(
+            fund=fund,
+            period_returns=_trailing_returns(fund),
+            rolling=rolling,
+            rolling_summary=rolling_summary,
+            avg_volatility={'fund': fund['volatility_30d'].mean()},
+            max_drawdown={'fund': fund['drawdown'].min()},
+            current_drawdown=fund['drawdown'].iloc[-1],
+            drawdown_episodes={'fund': _episodes(fund, 'nav')},
+        )
+
+    with instrumentation.span("analytics.series"):
+        benchmark = _series_analytics(benchmark['date'].to_numpy(), benchmark['close'].to_numpy(), 'close')
+    with instrumentation.span("analytics.rolling"):
+        rolling = rolling_returns.compare(
+            fund['date'].to_numpy(), fund['nav'].to_numpy(),
+            benchmark['date'].to_numpy(), benchmark['close'].to_numpy(),
+            windows=ROLLING_WINDOWS
+        )
+        rolling_summary = rolling.summary()
+    with instrumentation.span("analytics.align"):
+        aligned = aligned_returns.align({
+            'fund': (fund['date'].to_numpy(), fund['nav'].to_numpy()),
+            'benchmark': (benchmark['date'].to_numpy(), benchmark['close'].to_numpy()),
+        })
+    with instrumentation.span("analytics.risk"):
+        benchmark_returns = aligned.returns_of('benchmark')
+        risk = rolling_risk.rolling_risk(
+            np.column_stack([aligned.returns_of('fund'), benchmark_returns]), benchmark_returns,
+            windows=RISK_WINDOWS
+        )
+    return FundAnalytics(
+        fund=fund,
+        benchmark=benchmark,
+        period_returns=_trailing_returns(fund),
+        rolling=rolling,
+        rolling_summary=rolling_summary,
+        avg_volatility={'fund': fund['volatility_30d'].mean(), 'benchmark': benchmark['volatility_30d'].mean()},
+        max_drawdown={'fund': fund['drawdown'].min(), 'benchmark': benchmark['drawdown'].min()},
+        current_drawdown=fund['drawdown'].iloc[-1],
+        drawdown_episodes={'fund': _episodes(fund, 'nav'), 'benchmark': _episodes(benchmark, 'close')},
+        aligned=aligned,
+        risk=risk,
+    )
@@ -0,0 +1,179 @@
+"""Library of benchmark indices served from the local store.
+
+    python benchmark_library.py            # prefetch every benchmark
+    python benchmark_library.py --force    # re-download even if fresh
+
+Histories are read from the store and kept in memory, so switching
+benchmarks needs no network round trip. A stale history is still served
+straight away and refreshed in the background.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import benchmark_store
+import instrumentation
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger("benchmark_library")
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    key: str
+    name: str
+    # Yahoo Finance symbol, or a local CSV with date,close columns
+    ticker: str = None
+    csv_path: str = None
+
+    @property
+    def store_ticker(self):
+        return self.ticker if self.ticker else f"csv:{self.key}"
+
+
+BENCHMARKS = {b.key: b for b in (
+    Benchmark("BSE500", "BSE 500 Index", ticker="BSE-500.BO"),
+    Benchmark("NIFTY50", "Nifty 50", ticker="^NSEI"),
+    Benchmark("NIFTY500", "Nifty 500", ticker="^CRSLDX"),
+    Benchmark("SENSEX", "BSE Sensex", ticker="^BSESN"),
+    Benchmark("BSEMIDCAP", "BSE Midcap", ticker="BSE-MIDCAP.BO"),
+    Benchmark("BSESMALLCAP", "BSE Smallcap", ticker="BSE-SMLCAP.BO"),
+    Benchmark("NIFTYBANK", "Nifty Bank", ticker="^NSEBANK"),
+    Benchmark("NIFTYIT", "Nifty IT", ticker="^CNXIT"),
+    Benchmark("BSE500_CSV", "BSE 500 (bundled CSV)", csv_path=os.path.join(BASE_DIR, "benchmark_data.csv")),
+)}
+DEFAULT_BENCHMARK = "BSE500"
+
+# First matching fragment of the scheme category picks the benchmark;
+# more specific fragments come before the ones they contain
+CATEGORY_BENCHMARKS = (
+    ("large & mid cap", "NIFTY500"),
+    ("small cap", "BSESMALLCAP"),
+    ("mid cap", "BSEMIDCAP"),
+    ("large cap", "NIFTY50"),
+    ("index", "NIFTY50"),
+    ("banking", "NIFTYBANK"),
+    ("financial", "NIFTYBANK"),
+    ("technology", "NIFTYIT"),
+)
+
+_frames = {}
+_frames_lock = threading.Lock()
+# yfinance downloads are not thread-safe, so refreshes run one at a time
+_refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="benchmark-refresh")
+_refreshing = set()
+_last_refresh = {}
+# How often a served history is checked for newer closes
+REFRESH_CHECK_SECONDS = 300
+
+
+def for_category(scheme_category):
+    """Benchmark key for a scheme category, falling back to the default."""
+    category = (scheme_category or "").lower()
+    for fragment, key in CATEGORY_BENCHMARKS:
+        if fragment in category:
+            return key
+    return DEFAULT_BENCHMARK
+
+
+def _csv_changed(benchmark):
+    synced = benchmark_store.synced_at(benchmark.store_ticker)
+    if synced is None:
+        return True
+    modified = datetime.fromtimestamp(os.path.getmtime(benchmark.csv_path), timezone.utc)
+    return modified > synced
+
+
+def sync(key, force=False):
+    """Bring one benchmark's stored history up to date; returns rows added."""
+    benchmark = BENCHMARKS[key]
+    if benchmark.csv_path:
+        if force or _csv_changed(benchmark):
+            return benchmark_store.import_csv(benchmark.store_ticker, benchmark.csv_path)
+        return 0
+    return benchmark_store.sync_ticker(benchmark.ticker, force=force)
+
+
+def _refresh(key):
+    try:
+        if sync(key):
+            # Newer rows are in the store; the next read picks them up
+            with _frames_lock:
+                _frames.pop(key, None)
+    except Exception as e:
+        logger.warning("Refreshing benchmark %s failed: %s", key, e)
+    finally:
+        with _frames_lock:
+            _refreshing.discard(key)
+
+
+def refresh_in_background(key):
+    now = time.monotonic()
+    with _frames_lock:
+        if key in _refreshing or now - _last_refresh.get(key, -REFRESH_CHECK_SECONDS) < REFRESH_CHECK_SECONDS:
+            return
+        _refreshing.add(key)
+        _last_refresh[key] = now
+    _refresher.submit(_refresh, key)
+
+
+def get_history(key):
+    """History of a library benchmark as a DataFrame with 'date' and 'close'.
+
+    Served from memory or the local store; only a benchmark that has never
+    been fetched is downloaded before returning. Treat the frame as read-only.
+    """
+    with _frames_lock:
+        frame = _frames.get(key)
+    instrumentation.count_cache("benchmark.history", hit=frame is not None)
+    if frame is None:
+        benchmark = BENCHMARKS[key]
+        with instrumentation.span("benchmark.load", benchmark=key):
+            if benchmark_store.synced_at(benchmark.store_ticker) is None:
+                sync(key)
+            frame = benchmark_store.load_ticker(benchmark.store_ticker)
+        with _frames_lock:
+            _frames[key] = frame
+    refresh_in_background(key)
+    return frame
+
+
+def prefetch(keys=None, force=False):
+    """Sync every benchmark (or `keys`) into the store; returns {key: error}."""
+    errors = {}
+    for key in keys or BENCHMARKS:
+        try:
+            added = sync(key, force=force)
+            logger.info("%s: %d rows added", key, added)
+        except Exception as e:
+            logger.warning("%s: %s", key, e)
+            errors[key] = str(e)
+    with _frames_lock:
+        _frames.clear()
+    return errors
+
+
+def prefetch_in_background(keys=None):
+    """Queue a prefetch behind any running refresh; returns its future."""
+    return _refresher.submit(prefetch, keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("keys", nargs="*", help=f"benchmarks to fetch (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--force", action="store_true", help="re-download even if recently synced")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    errors = prefetch(args.keys or None, force=args.force)
+    raise SystemExit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+from datetime import datetime, time, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from nav_store import connect as _connect_store
+
+# Index closes move once a trading day; refresh the tail at most hourly
+SYNC_INTERVAL = timedelta(hours=1)
+# Every library index trades on NSE/BSE. Until the session has closed (with
+# some slack for the closing figure to be published) a bar dated today is
+# a partial one, and is not stored since later syncs only append
+EXCHANGE_TZ = timezone(timedelta(hours=5, minutes=30))
+SESSION_CLOSED_AT = time(16, 0)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS benchmarks (
+    ticker TEXT PRIMARY KEY,
+    last_day INTEGER,
+    synced_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS benchmark_close (
+    ticker TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    close REAL NOT NULL,
+    PRIMARY KEY (ticker, day)
+) WITHOUT ROWID;
+"""
+
+
+def connect():
+    conn = _connect_store()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _last_closed_day(now=None):
+    """Latest exchange date whose session is over, as days since the epoch."""
+    local = (now or _utcnow()).astimezone(EXCHANGE_TZ)
+    day = local.date() if local.time() >= SESSION_CLOSED_AT else local.date() - timedelta(days=1)
+    return int(np.datetime64(day, 'D').astype(np.int64))
+
+
+def _download(ticker, start_day=None):
+    # yfinance is only imported when a download is actually needed
+    import yfinance as yf
+
+    if start_day is None:
+        data = yf.download(ticker, period="max", progress=False)
+    else:
+        start = np.datetime64(int(start_day), 'D').astype(str)
+        data = yf.download(ticker, start=start, progress=False)
+    if data is None or data.empty:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    close = data['Close']
+    if isinstance(close, pd.DataFrame):  # yfinance returns (field, ticker) columns
+        close = close.iloc[:, 0]
+    close = close.dropna()
+    days = close.index.values.astype('datetime64[D]').astype(np.int64)
+    return days, close.to_numpy(dtype=np.float64)
+
+
+def sync_ticker(ticker, conn=None, force=False):
+    """Download the full history once, then only the missing trailing days."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        row = conn.execute(
+            "SELECT last_day, synced_at FROM benchmarks WHERE ticker = ?", (ticker,)
+        ).fetchone()
+        last_day = row[0] if row else None
+        if row and not force and _utcnow() - datetime.fromisoformat(row[1]) < SYNC_INTERVAL:
+            return 0
+
+        days, closes = _download(ticker, last_day)
+        keep = days <= _last_closed_day()
+        if last_day is not None:
+            keep &= days > last_day
+        days, closes = days[keep], closes[keep]
+
+        new_last = int(days.max()) if len(days) else last_day
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO benchmark_close (ticker, day, close) VALUES (?, ?, ?)",
+                zip([ticker] * len(days), days.tolist(), closes.tolist()),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO benchmarks (ticker, last_day, synced_at) VALUES (?, ?, ?)",
+                (ticker, new_last, _utcnow().isoformat()),
+            )
+        return len(days)
+    finally:
+        if own:
+            conn.close()
+
+
+def synced_at(ticker, conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        row = conn.execute("SELECT synced_at FROM benchmarks WHERE ticker = ?", (ticker,)).fetchone()
+    finally:
+        if own:
+            conn.close()
+    return datetime.fromisoformat(row[0]) if row else None
+
+
+def import_csv(ticker, path, conn=None):
+    """Replace the stored history of `ticker` with a local CSV of date,close rows."""
+    frame = pd.read_csv(path, usecols=['date', 'close'], parse_dates=['date']).dropna()
+    frame = frame.sort_values('date').drop_duplicates('date', keep='last')
+    days = frame['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    closes = frame['close'].to_numpy(dtype=np.float64)
+
+    own = conn is None
+    conn = conn or connect()
+    try:
+        with conn:
+            conn.execute("DELETE FROM benchmark_close WHERE ticker = ?", (ticker,))
+            conn.executemany(
+                "INSERT INTO benchmark_close (ticker, day, close) VALUES (?, ?, ?)",
+                zip([ticker] * len(days), days.tolist(), closes.tolist()),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO benchmarks (ticker, last_day, synced_at) VALUES (?, ?, ?)",
+                (ticker, int(days.max()) if len(days) else None, _utcnow().isoformat()),
+            )
+        return len(days)
+    finally:
+        if own:
+            conn.close()
+
+
+def load_ticker(ticker, conn=None):
+    """Stored history as a DataFrame with 'date' and 'close' columns sorted by date."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute(
+            "SELECT day, close FROM benchmark_close WHERE ticker = ? ORDER BY day", (ticker,)
+        ).fetchall()
+    finally:
+        if own:
+            conn.close()
+
+    table = np.array(rows, dtype=np.float64).reshape(-1, 2)
+    return pd.DataFrame({
+        'date': table[:, 0].astype(np.int64).astype('datetime64[D]').astype('datetime64[ns]'),
+        'close': table[:, 1],
+    })
+
+
+def get_history(ticker, force=False):
+    # Like nav_store.get_scheme: a failed refresh falls back to stored data
+    conn = connect()
+    try:
+        try:
+            sync_ticker(ticker, conn=conn, force=force)
+        except Exception:
+            if conn.execute("SELECT 1 FROM benchmarks WHERE ticker = ?", (ticker,)).fetchone() is None:
+                raise
+        return load_ticker(ticker, conn=conn)
+    finally:
+        conn.close()
+
@@ -0,0 +1,48 @@
+import numpy as np
+
+# Points kept per chart trace; about one per horizontal pixel of a wide chart
+MAX_POINTS = 2000
+
+
+def minmax_indices(values, max_points=MAX_POINTS):
+    """Sorted indices of at most `max_points` points that keep the shape of `values`.
+
+    The series is cut into equal buckets and each bucket keeps its first,
+    last, lowest and highest point, so peaks and drawdown troughs survive
+    exactly. NaNs are skipped for the extremes; buckets that are all NaN
+    keep their ends, leaving gaps in the line where the data has them.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+
+    buckets = max(max_points // 4, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    starts, sizes = edges[:-1], np.diff(edges)
+    bucket_of = np.repeat(np.arange(buckets), sizes)
+
+    missing = np.isnan(values)
+    low = np.where(missing, np.inf, values)
+    high = np.where(missing, -np.inf, values)
+    # First position in each bucket equal to that bucket's extreme
+    lowest = np.repeat(np.minimum.reduceat(low, starts), sizes)
+    highest = np.repeat(np.maximum.reduceat(high, starts), sizes)
+    argmin = np.flatnonzero((low == lowest) & ~missing)
+    argmax = np.flatnonzero((high == highest) & ~missing)
+    argmin = argmin[np.unique(bucket_of[argmin], return_index=True)[1]]
+    argmax = argmax[np.unique(bucket_of[argmax], return_index=True)[1]]
+
+    return np.unique(np.concatenate([starts, edges[1:] - 1, argmin, argmax]))
+
+
+def downsample(x, y, max_points=MAX_POINTS):
+    """(x, y) reduced to at most `max_points` points as NumPy arrays."""
+    x, y = np.asarray(x), np.asarray(y)
+    keep = minmax_indices(y, max_points)
+    return x[keep], y[keep]
+
+
+def downsample_frame(frame, y_col, max_points=MAX_POINTS):
+    """Rows of `frame` kept when downsampling its `y_col` column."""
+    return frame.iloc[minmax_indices(frame[y_col].to_numpy(dtype=np.float64), max_points)]
@@ -0,0 +1,146 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+_NAT = np.datetime64('NaT', 'D')
+
+
+@dataclass(frozen=True)
+class DrawdownEpisodes:
+    """Every drawdown of a series, from a peak to the day it is regained.
+
+    Arrays are aligned, one entry per episode in date order. The last
+    episode is still open (recovery is NaT) when the series ends below its
+    peak. `last_day`, `peak_value` and `trough_value` carry the scan state
+    so `extend` can process only new rows.
+    """
+    peak: np.ndarray
+    trough: np.ndarray
+    recovery: np.ndarray
+    depth: np.ndarray
+    last_day: np.datetime64 = None
+    peak_value: float = None
+    # Lowest value of the open episode, None while the series is at a peak
+    trough_value: float = None
+
+    def __len__(self):
+        return len(self.depth)
+
+    @property
+    def days_to_trough(self):
+        return (self.trough - self.peak).astype(np.int64)
+
+    @property
+    def days_to_recovery(self):
+        """Trough to recovery in days, NaN for the open episode."""
+        days = (self.recovery - self.trough).astype(np.float64)
+        days[np.isnat(self.recovery)] = np.nan
+        return days
+
+    @property
+    def underwater_days(self):
+        """Peak to recovery (or to the last day, if still open) in days."""
+        end = np.where(np.isnat(self.recovery), self.last_day, self.recovery)
+        return (end - self.peak).astype(np.int64)
+
+    def table(self, top=None):
+        """Episodes as a DataFrame, deepest first; `top` limits the rows."""
+        order = np.argsort(self.depth, kind='stable')[:top]
+        return pd.DataFrame({
+            'Peak': self.peak[order].astype('datetime64[ns]'),
+            'Trough': self.trough[order].astype('datetime64[ns]'),
+            'Recovery': self.recovery[order].astype('datetime64[ns]'),
+            'Depth (%)': self.depth[order] * 100,
+            'Days to Trough': self.days_to_trough[order],
+            'Days to Recover': self.days_to_recovery[order],
+            'Days Underwater': self.underwater_days[order],
+        })
+
+
+def _scan(days, values):
+    """(peak, trough, recovery, depth, peak_value, trough_value) of a series;
+    the first row starts at its own high."""
+    running = np.maximum.accumulate(values)
+    drawdown = values / running - 1
+    underwater = drawdown < 0
+    n = len(values)
+    rows = np.arange(n)
+
+    prev = np.concatenate([[False], underwater[:-1]])
+    starts = np.flatnonzero(underwater & ~prev)
+    ends = np.flatnonzero(~underwater & prev)
+    # A run still underwater at the end has no recovery row
+    closed = len(ends)
+    if len(starts) == 0:
+        empty = np.empty(0, dtype='datetime64[D]')
+        return empty, empty, empty, np.empty(0), float(running[-1]), None
+
+    # Rows between runs have a drawdown of 0, so reducing from one start to
+    # the next gives each run's minimum
+    depth = np.minimum.reduceat(drawdown, starts)
+    marks = np.zeros(n, dtype=np.int64)
+    marks[starts] = 1
+    run_of = np.cumsum(marks) - 1
+    in_run = underwater & (run_of >= 0)
+    at_min = np.flatnonzero(in_run & (drawdown == depth[np.maximum(run_of, 0)]))
+    trough_rows = at_min[np.unique(run_of[at_min], return_index=True)[1]]
+
+    # The first row is never underwater, so every run has a row before it.
+    # The latest row at the running high before each run is its peak
+    last_high = np.maximum.accumulate(np.where(underwater, -1, rows))
+    peak = days[last_high[starts - 1]]
+    recovery = np.full(len(starts), _NAT)
+    recovery[:closed] = days[ends]
+
+    trough_value = None if closed == len(starts) else float(values[trough_rows[-1]])
+    return peak, days[trough_rows], recovery, depth, float(running[-1]), trough_value
+
+
+def find_episodes(dates, values):
+    """All drawdown episodes of a NAV or index level series."""
+    days = np.asarray(dates).astype('datetime64[D]')
+    values = np.asarray(values, dtype=np.float64)
+    keep = ~np.isnan(values)
+    days, values = days[keep], values[keep]
+    if len(values) == 0:
+        empty = np.empty(0, dtype='datetime64[D]')
+        return DrawdownEpisodes(empty, empty, empty, np.empty(0))
+    peak, trough, recovery, depth, peak_value, trough_value = _scan(days, values)
+    return DrawdownEpisodes(peak, trough, recovery, depth, days[-1], peak_value, trough_value)
+
+
+def extend(episodes, dates, values):
+    """Episodes after appending new rows; rows up to `episodes.last_day` are ignored.
+
+    Only the new rows are scanned, seeded with the previous peak (and the
+    open episode's trough), so the cost is proportional to the update.
+    """
+    if episodes.last_day is None:
+        return find_episodes(dates, values)
+    days = np.asarray(dates).astype('datetime64[D]')
+    values = np.asarray(values, dtype=np.float64)
+    keep = (days > episodes.last_day) & ~np.isnan(values)
+    if not keep.any():
+        return episodes
+
+    is_open = episodes.trough_value is not None
+    closed = len(episodes) - 1 if is_open else len(episodes)
+    # Seed rows reproduce the state at last_day: the peak, then the open
+    # episode's trough, so that episode is rebuilt with the new rows
+    if is_open:
+        seed_days = np.array([episodes.peak[-1], episodes.trough[-1]])
+        seed_values = [episodes.peak_value, episodes.trough_value]
+    else:
+        seed_days = np.array([episodes.last_day])
+        seed_values = [episodes.peak_value]
+    peak, trough, recovery, depth, peak_value, trough_value = _scan(
+        np.concatenate([seed_days, days[keep]]), np.concatenate([seed_values, values[keep]])
+    )
+    return DrawdownEpisodes(
+        np.concatenate([episodes.peak[:closed], peak]),
+        np.concatenate([episodes.trough[:closed], trough]),
+        np.concatenate([episodes.recovery[:closed], recovery]),
+        np.concatenate([episodes.depth[:closed], depth]),
+        days[keep][-1], peak_value, trough_value,
+    )
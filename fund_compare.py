@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import aligned_returns
+import nav_store
+import period_returns
+
+# Upper bound on concurrent mfapi.in requests from one comparison
+MAX_WORKERS = 16
+TRADING_DAYS = 252
+
+COMPARE_HORIZONS = ('1M', '6M', '1Y', '3Y', '5Y')
+
+
+def fetch_schemes(scheme_codes, max_workers=MAX_WORKERS):
+    """Sync and load several schemes concurrently.
+
+    Returns ({scheme_code: scheme}, {scheme_code: error}).
+    """
+    schemes, errors = {}, {}
+    codes = list(dict.fromkeys(int(code) for code in scheme_codes))
+    if not codes:
+        return schemes, errors
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(codes))) as pool:
+        futures = {pool.submit(nav_store.get_scheme, code): code for code in codes}
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                scheme = future.result()
+                if scheme is not None and len(scheme['dates']):
+                    schemes[code] = scheme
+                else:
+                    errors[code] = "no NAV history"
+            except Exception as e:
+                errors[code] = str(e)
+    # Keep the caller's order rather than completion order
+    return {code: schemes[code] for code in codes if code in schemes}, errors
+
+
+def build_nav_matrix(series):
+    """Align {key: (dates, navs)} into one (dates x funds) float64 matrix.
+
+    The date axis is the union of all dates. Each fund is forward-filled
+    between its first and last NAV and left NaN outside that range.
+    """
+    aligned = aligned_returns.align(series, calendar='union')
+    return aligned.dates, aligned.levels, list(aligned.keys)
+
+
+def observed_mask(dates, series, keys):
+    """(dates x keys) mask of the rows where each fund has a NAV of its own
+    rather than one forward-filled by build_nav_matrix."""
+    dates = np.asarray(dates).astype('datetime64[D]')
+    observed = np.zeros((len(dates), len(keys)), dtype=bool, order='F')
+    for col, key in enumerate(keys):
+        own_dates = np.asarray(series[key][0]).astype('datetime64[D]')
+        observed[np.searchsorted(dates, own_dates), col] = True
+    return observed
+
+
+def daily_returns(matrix, observed):
+    """Returns between each fund's consecutive NAVs on a forward-filled
+    matrix, NaN on rows `observed` marks as filled, so a date only other
+    funds have does not count as a 0% day."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily = matrix[1:] / matrix[:-1] - 1
+    # A forward-filled row before an observation holds the previous NAV
+    daily[~observed[1:]] = np.nan
+    return daily
+
+
+def compare_metrics(dates, matrix, keys, observed, horizons=COMPARE_HORIZONS):
+    """Column-wise metrics for every fund in an aligned NAV matrix.
+
+    `observed` (from observed_mask) keeps volatility to each fund's own
+    NAV dates.
+    """
+    dates = np.asarray(dates).astype('datetime64[D]')
+    valid = ~np.isnan(matrix)
+    n = len(dates)
+    first = np.argmax(valid, axis=0)
+    last = n - 1 - np.argmax(valid[::-1], axis=0)
+    cols = np.arange(matrix.shape[1])
+
+    returns = period_returns.batch_trailing_returns(dates, matrix, horizons, strict=True)
+    years = (dates[last] - dates[first]) / np.timedelta64(1, 'D') / 365.0
+    growth = matrix[last, cols] / matrix[first, cols]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = np.where(years > 0, (growth ** (1.0 / years) - 1) * 100, np.nan)
+    daily = daily_returns(matrix, observed)
+    volatility = np.nanstd(daily, axis=0, ddof=1) * np.sqrt(TRADING_DAYS) * 100
+
+    running_max = np.fmax.accumulate(matrix, axis=0)
+    drawdown = (matrix / running_max - 1) * 100
+    max_drawdown = np.nanmin(drawdown, axis=0)
+    current_drawdown = drawdown[last, cols]
+
+    metrics = {f"{h} Return (%)": returns[i] for i, h in enumerate(horizons)}
+    metrics.update({
+        'CAGR Since Inception (%)': cagr,
+        'Volatility (%)': volatility,
+        'Max Drawdown (%)': max_drawdown,
+        'Current Drawdown (%)': current_drawdown,
+        'Start Date': dates[first].astype('datetime64[ns]'),
+        'Latest NAV': matrix[last, cols],
+    })
+    return pd.DataFrame(metrics, index=pd.Index(keys, name='scheme_code'))
+
+
+def normalized_growth(dates, matrix):
+    """Growth of 100 from the first date every fund has a NAV."""
+    start = int(np.max(np.argmax(~np.isnan(matrix), axis=0)))
+    window = matrix[start:]
+    return dates[start:], window / window[0] * 100
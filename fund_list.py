@@ -0,0 +1,167 @@
+"""Scheme list snapshot shared by every session of the process.
+
+The list is kept on disk as two columns, scheme codes and names, and only
+re-downloaded when mfapi.in reports a change (ETag / Last-Modified). A
+download that turns out identical keeps the previous snapshot, so the
+search index built from it is not rebuilt either.
+"""
+import hashlib
+import io
+import os
+import sys
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import requests
+
+import mfapi_client
+import nav_store
+from nav_ingest import decode_payload
+
+FUND_LIST_PATH = os.path.join(os.path.dirname(nav_store.STORE_PATH), "fund_list.npz")
+
+# Snapshots younger than this are used without asking mfapi.in
+REFRESH_INTERVAL = timedelta(hours=1)
+# Wait between attempts while mfapi.in is unreachable and a stale list is served
+RETRY_INTERVAL = timedelta(minutes=5)
+
+_snapshot = None
+_retry_after = datetime.min.replace(tzinfo=timezone.utc)
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class FundList:
+    codes: np.ndarray
+    names: list
+    # Digest of codes and names; changes only when the list itself does
+    version: str
+    synced_at: datetime
+    etag: str = None
+    last_modified: str = None
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _version(codes, blob):
+    digest = hashlib.sha256(codes.tobytes())
+    digest.update(blob.tobytes())
+    return digest.hexdigest()
+
+
+def _encode_names(names):
+    """Names as one UTF-8 buffer plus the end offset of each name."""
+    encoded = [name.encode("utf-8") for name in names]
+    offsets = np.cumsum([len(e) for e in encoded], dtype=np.int64)
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _decode_names(offsets, blob):
+    data = blob.tobytes()
+    starts = np.concatenate([[0], offsets[:-1]]).tolist()
+    return [sys.intern(data[s:e].decode("utf-8")) for s, e in zip(starts, offsets.tolist())]
+
+
+def _from_records(records, synced_at, etag=None, last_modified=None):
+    codes = np.fromiter((int(r['schemeCode']) for r in records), dtype=np.int64, count=len(records))
+    names = [sys.intern(str(r.get('schemeName') or "")) for r in records]
+    _, blob = _encode_names(names)
+    return FundList(codes, names, _version(codes, blob), synced_at, etag, last_modified)
+
+
+def save(fund_list, path=FUND_LIST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    offsets, blob = _encode_names(fund_list.names)
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        codes=fund_list.codes,
+        name_offsets=offsets,
+        name_blob=blob,
+        synced_at=np.array(fund_list.synced_at.isoformat()),
+        etag=np.array(fund_list.etag or ""),
+        last_modified=np.array(fund_list.last_modified or ""),
+    )
+    # Write then rename so other processes never read a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fp:
+        fp.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+
+
+def load(path=FUND_LIST_PATH):
+    """The snapshot stored on disk, or None if there is none yet."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        codes, offsets, blob = data['codes'], data['name_offsets'], data['name_blob']
+        return FundList(
+            codes=codes,
+            names=_decode_names(offsets, blob),
+            version=_version(codes, blob),
+            synced_at=datetime.fromisoformat(str(data['synced_at'])),
+            etag=str(data['etag']) or None,
+            last_modified=str(data['last_modified']) or None,
+        )
+
+
+def refresh(previous=None, path=FUND_LIST_PATH):
+    """Fetch the list if it changed since `previous`, store it and return it."""
+    headers = {}
+    if previous is not None:
+        if previous.etag:
+            headers["If-None-Match"] = previous.etag
+        if previous.last_modified:
+            headers["If-Modified-Since"] = previous.last_modified
+
+    response = mfapi_client.get(headers=headers)
+    now = _utcnow()
+    if response.status_code == 304 and previous is not None:
+        fund_list = replace(previous, synced_at=now)
+    else:
+        fund_list = _from_records(
+            decode_payload(response.content), now,
+            response.headers.get("ETag"), response.headers.get("Last-Modified")
+        )
+        # Without validators from the server, fall back to diffing the content
+        if previous is not None and fund_list.version == previous.version:
+            fund_list = replace(previous, synced_at=now, etag=fund_list.etag, last_modified=fund_list.last_modified)
+    save(fund_list, path)
+    return fund_list
+
+
+def _due(snapshot):
+    now = _utcnow()
+    return now - snapshot.synced_at >= REFRESH_INTERVAL and now >= _retry_after
+
+
+def get_fund_list(force=False):
+    """Current scheme list, refreshed at most once per REFRESH_INTERVAL.
+
+    Falls back to the stored snapshot when mfapi.in is unreachable and only
+    raises if there is nothing stored either.
+    """
+    global _snapshot, _retry_after
+    snapshot = _snapshot
+    if snapshot is not None and not force and not _due(snapshot):
+        return snapshot
+    with _lock:
+        # Another thread may have refreshed while this one waited
+        snapshot = _snapshot or load()
+        if snapshot is None or force or _due(snapshot):
+            try:
+                snapshot = refresh(snapshot)
+            except (requests.RequestException, ValueError):
+                if snapshot is None:
+                    raise
+                # Serve the stale list for a while rather than retrying on every call
+                _retry_after = _utcnow() + RETRY_INTERVAL
+        _snapshot = snapshot
+    return snapshot
@@ -0,0 +1,161 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+import numpy as np
+
+import instrumentation
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Score contributed by a query token depending on how it matched a name token
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+INFIX_SCORE = 1.0
+
+
+def normalize(text):
+    return " ".join(_TOKEN_RE.findall(text.lower()))
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class FundSearchIndex:
+    """Inverted index over scheme names, built once per fund-list refresh.
+
+    Every query token has to match some token of the scheme name, either
+    exactly, as a prefix or (for 3+ characters) anywhere inside it.
+    """
+
+    def __init__(self, codes, names, cache_size=512):
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.names = list(names)
+        self.normalized = [normalize(n) for n in self.names]
+        self._name_len = np.fromiter((len(n) for n in self.normalized), dtype=np.int32, count=len(self.names))
+        first_tokens = [n.split(" ", 1)[0] for n in self.normalized]
+
+        postings = {}
+        for fund_id, name in enumerate(self.normalized):
+            for token in set(name.split()):
+                postings.setdefault(token, []).append(fund_id)
+
+        # Sorted vocabulary gives prefix ranges with two bisects; postings are
+        # kept in the same order so a range maps straight to posting lists
+        self._vocab = sorted(postings)
+        self._postings = [np.array(postings[t], dtype=np.int32) for t in self._vocab]
+
+        vocab_trigrams = {}
+        for token_id, token in enumerate(self._vocab):
+            for gram in _trigrams(token):
+                vocab_trigrams.setdefault(gram, []).append(token_id)
+        self._trigrams = {g: np.array(ids, dtype=np.int32) for g, ids in vocab_trigrams.items()}
+
+        # Vocabulary id of each name's leading token, used to rank names that
+        # start with the query ahead of names that merely contain it
+        vocab_ids = {t: i for i, t in enumerate(self._vocab)}
+        self._first_token = np.array([vocab_ids.get(t, -1) for t in first_tokens], dtype=np.int32)
+
+        self._cache_size = cache_size
+        self._token_cache = OrderedDict()
+        self._query_cache = OrderedDict()
+        # The index is shared by every session, so cache bookkeeping is locked
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _cached(self, name, cache, key, compute):
+        with self._lock:
+            hit = key in cache
+            if hit:
+                cache.move_to_end(key)
+                value = cache[key]
+        instrumentation.count_cache(name, hit=hit)
+        if hit:
+            return value
+        value = compute()
+        with self._lock:
+            cache[key] = value
+            if len(cache) > self._cache_size:
+                cache.popitem(last=False)
+        return value
+
+    def _funds_for(self, token_ids):
+        if len(token_ids) == 0:
+            return np.empty(0, dtype=np.int32)
+        if len(token_ids) == 1:
+            return self._postings[token_ids[0]]
+        return np.unique(np.concatenate([self._postings[t] for t in token_ids]))
+
+    def _prefix_range(self, token):
+        return bisect_left(self._vocab, token), bisect_left(self._vocab, token + "\uffff")
+
+    def _match_token(self, token):
+        # Per-fund score array for a single query token (0 means no match)
+        lo, hi = self._prefix_range(token)
+        prefix_ids = np.arange(lo, hi, dtype=np.int32)
+
+        infix_ids = np.empty(0, dtype=np.int32)
+        if len(token) >= 3:
+            grams = [self._trigrams.get(g) for g in _trigrams(token)]
+            if all(g is not None for g in grams):
+                candidates = grams[0]
+                for g in grams[1:]:
+                    candidates = np.intersect1d(candidates, g, assume_unique=True)
+                infix_ids = np.array(
+                    [t for t in candidates if not (lo <= t < hi) and token in self._vocab[t]],
+                    dtype=np.int32,
+                )
+
+        score = np.zeros(len(self.names), dtype=np.float32)
+        infix_funds = self._funds_for(infix_ids)
+        score[infix_funds] = INFIX_SCORE
+        prefix_funds = self._funds_for(prefix_ids)
+        score[prefix_funds] = PREFIX_SCORE
+        if lo < hi and self._vocab[lo] == token:
+            score[self._postings[lo]] = EXACT_SCORE
+        return score
+
+    def _score(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        total = None
+        for token in dict.fromkeys(tokens):
+            score = self._cached("search.token", self._token_cache, token, lambda: self._match_token(token))
+            if total is None:
+                total = score.copy()
+            else:
+                # A fund only matches when every query token matched it
+                total = np.where((total > 0) & (score > 0), total + score, 0)
+        return total
+
+    def _ranked(self, query):
+        score = self._score(query)
+        if score is None:
+            return np.empty(0, dtype=np.int32)
+        hits = np.flatnonzero(score)
+        # Best score first, then names starting with the query, then shorter names
+        lo, hi = self._prefix_range(tokenize(query)[0])
+        first = self._first_token[hits]
+        starts = (first >= lo) & (first < hi)
+        order = np.lexsort((self._name_len[hits], ~starts, -score[hits]))
+        return hits[order]
+
+    def _lookup(self, query):
+        key = normalize(query)
+        return self._cached("search.query", self._query_cache, key, lambda: self._ranked(key))
+
+    def search(self, query, limit=50):
+        """Top `limit` matches as (scheme_code, scheme_name) tuples."""
+        return [(int(self.codes[i]), self.names[i]) for i in self._lookup(query)[:limit]]
+
+    def count(self, query):
+        return len(self._lookup(query))
@@ -0,0 +1,428 @@
+"""Running analytics state per scheme, updated from appended NAV rows only.
+
+The state keeps the first NAV, the running peak and worst drawdown, prefix
+sums of daily returns and their squares, the last ten years of NAVs for
+window anchors, the anchor row of each rolling-return window, the rolling
+returns seen so far (sorted, for their median), counts of windows that
+beat the benchmark and running sums for alpha/beta against it. Appending
+rows touches only those rows plus a bounded tail, so a daily refresh
+costs the same for a 3-year-old and a 30-year-old fund. The state is
+persisted next to the NAV history in the local store.
+"""
+import io
+from dataclasses import dataclass
+
+import numpy as np
+
+import drawdown_episodes
+import nav_store
+import period_returns
+import rolling_returns
+
+# Horizons served from the state; rolling-return distributions need the
+# full history and are not part of it
+RETURN_HORIZONS = ('1D', '1W', '1M', '3M', '6M', '1Y', '3Y', '5Y', '10Y', 'YTD', 'SI')
+CAGR_HORIZONS = ('1Y', '3Y', '5Y', 'SI')
+VOLATILITY_WINDOW = 30
+TRADING_DAYS = 252
+# Rolling-return windows summarized in the state
+ROLLING_WINDOWS = ('1Y', '3Y')
+# NAVs kept for window anchors: the longest trailing horizon plus slack
+TAIL_DAYS = max(period_returns.HORIZON_DAYS.values()) + 7
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analytics_state (
+    scheme_code INTEGER PRIMARY KEY,
+    last_day INTEGER NOT NULL,
+    state BLOB NOT NULL
+);
+"""
+
+_DAY = np.timedelta64(1, 'D')
+_NAT = np.datetime64('NaT', 'D')
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    """A benchmark history with its rolling returns for ROLLING_WINDOWS,
+    computed once and shared by every scheme's update."""
+    key: str
+    dates: np.ndarray
+    closes: np.ndarray
+    rolling: dict
+
+
+def benchmark_series(key, dates, closes):
+    dates = np.asarray(dates).astype('datetime64[D]')
+    closes = np.asarray(closes, dtype=np.float64)
+    rolling = {w: rolling_returns.rolling_return(dates, closes, rolling_returns.ROLLING_WINDOWS[w]) for w in ROLLING_WINDOWS}
+    return Benchmark(key=key, dates=dates, closes=closes, rolling=rolling)
+
+
+@dataclass(frozen=True)
+class AnalyticsState:
+    first_day: np.datetime64
+    first_nav: float
+    count: int
+    # Trailing NAV history; csum / csq are prefix sums of daily returns and
+    # squared returns since the first NAV, aligned with `days`
+    days: np.ndarray
+    navs: np.ndarray
+    csum: np.ndarray
+    csq: np.ndarray
+    peak: float
+    max_drawdown: float
+    # Sum and count of the 30-day rolling volatility series, for its mean
+    vol_sum: float
+    vol_count: int
+    episodes: drawdown_episodes.DrawdownEpisodes
+    # Rolling returns and alpha/beta cover the rows up to relative_day:
+    # the fund's own rows without a benchmark, else the dates it shares
+    # with the benchmark, which may lag the fund by a few days
+    benchmark: str
+    relative_day: np.datetime64
+    # Absolute row number of each rolling window's anchor for relative_day
+    anchors: np.ndarray
+    # Sorted rolling returns per window, and per window the number of
+    # dates with both returns and how many of those beat the benchmark
+    rolling: tuple
+    both: np.ndarray
+    beats: np.ndarray
+    # NAV and benchmark close on the last shared date, and sums of
+    # n, fund, benchmark, fund^2, benchmark^2 and fund*benchmark returns
+    pair_last: np.ndarray
+    pair_sums: np.ndarray
+
+    @property
+    def last_day(self):
+        return self.days[-1]
+
+
+def _std(total, squares, n):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (squares - total * total / n) / (n - 1)
+    return np.sqrt(np.maximum(variance, 0.0))
+
+
+def update(state, dates, navs, benchmark=None):
+    """State after appending the rows of (dates, navs) newer than `state`.
+
+    `state` may be None to start from scratch with the full history; a
+    state kept against a different `benchmark` (a Benchmark or None)
+    must be rebuilt that way.
+    """
+    dates = np.asarray(dates).astype('datetime64[D]')
+    navs = np.asarray(navs, dtype=np.float64)
+    keep = ~np.isnan(navs)
+    if state is not None:
+        keep &= dates > state.last_day
+    new_days, new_navs = dates[keep], navs[keep]
+    if len(new_days) == 0 and not _benchmark_ahead(state, benchmark):
+        return state
+
+    if state is None:
+        days, values = new_days, new_navs
+        returns = values[1:] / values[:-1] - 1
+        csum = np.concatenate([[0.0], np.cumsum(returns)])
+        csq = np.concatenate([[0.0], np.cumsum(returns * returns)])
+        start, count = 0, len(values)
+        peak, max_drawdown = -np.inf, 0.0
+        vol_sum, vol_count = 0.0, 0
+        episodes = drawdown_episodes.find_episodes(new_days, new_navs)
+        first_day, first_nav = new_days[0], float(new_navs[0])
+        relative = _empty_relative()
+    else:
+        days = np.concatenate([state.days, new_days])
+        values = np.concatenate([state.navs, new_navs])
+        returns = new_navs / np.concatenate([state.navs[-1:], new_navs[:-1]]) - 1
+        csum = np.concatenate([state.csum, state.csum[-1] + np.cumsum(returns)])
+        csq = np.concatenate([state.csq, state.csq[-1] + np.cumsum(returns * returns)])
+        start, count = len(state.days), state.count + len(new_navs)
+        peak, max_drawdown = state.peak, state.max_drawdown
+        vol_sum, vol_count = state.vol_sum, state.vol_count
+        episodes = drawdown_episodes.extend(state.episodes, new_days, new_navs) if len(new_navs) else state.episodes
+        first_day, first_nav = state.first_day, state.first_nav
+        relative = _relative_of(state)
+
+    if len(new_navs):
+        running = np.maximum.accumulate(np.concatenate([[peak], new_navs]))[1:]
+        max_drawdown = min(max_drawdown, float((new_navs / running - 1).min()))
+        peak = float(running[-1])
+
+    # 30-day volatility at each new row from prefix-sum differences; a row
+    # needs 30 returns behind it, i.e. overall row number >= 30
+    rows = np.arange(start, len(values))
+    overall = rows - len(values) + count
+    rows = rows[overall >= VOLATILITY_WINDOW]
+    if len(rows):
+        total = csum[rows] - csum[rows - VOLATILITY_WINDOW]
+        squares = csq[rows] - csq[rows - VOLATILITY_WINDOW]
+        vol = _std(total, squares, VOLATILITY_WINDOW) * np.sqrt(TRADING_DAYS) * 100
+        vol_sum += float(vol.sum())
+        vol_count += len(vol)
+
+    relative = _update_relative(relative, days, values, count, benchmark)
+
+    # Drop rows no window anchor can reach, keeping one row before the
+    # longest horizon, enough rows for the volatility window and every
+    # row the rolling windows have yet to reach or anchor on
+    cut = int(np.searchsorted(days, days[-1] - TAIL_DAYS * _DAY, side='left')) - 1
+    cut = min(cut, len(days) - VOLATILITY_WINDOW - 1)
+    cut = min(cut, int(np.searchsorted(days, relative['relative_day'], side='right')) if not np.isnat(relative['relative_day']) else 0)
+    anchored = relative['anchors'][relative['anchors'] >= 0]
+    if len(anchored):
+        cut = min(cut, int(anchored.min()) - (count - len(days)))
+    cut = max(cut, 0)
+    return AnalyticsState(
+        first_day=first_day,
+        first_nav=first_nav,
+        count=count,
+        days=days[cut:],
+        navs=values[cut:],
+        csum=csum[cut:],
+        csq=csq[cut:],
+        peak=peak,
+        max_drawdown=max_drawdown,
+        vol_sum=vol_sum,
+        vol_count=vol_count,
+        episodes=episodes,
+        **relative,
+    )
+
+
+def _empty_relative():
+    return {
+        'benchmark': None,
+        'relative_day': _NAT,
+        'anchors': np.full(len(ROLLING_WINDOWS), -1, dtype=np.int64),
+        'rolling': tuple(np.empty(0) for _ in ROLLING_WINDOWS),
+        'both': np.zeros(len(ROLLING_WINDOWS), dtype=np.int64),
+        'beats': np.zeros(len(ROLLING_WINDOWS), dtype=np.int64),
+        'pair_last': np.full(2, np.nan),
+        'pair_sums': np.zeros(6),
+    }
+
+
+def _relative_of(state):
+    return {
+        'benchmark': state.benchmark, 'relative_day': state.relative_day, 'anchors': state.anchors,
+        'rolling': state.rolling, 'both': state.both, 'beats': state.beats,
+        'pair_last': state.pair_last, 'pair_sums': state.pair_sums,
+    }
+
+
+def _relative_limit(last_day, benchmark):
+    if benchmark is None or len(benchmark.dates) == 0:
+        return last_day
+    return min(last_day, benchmark.dates[-1])
+
+
+def _benchmark_ahead(state, benchmark):
+    """Whether benchmark rows arrived that let the relative stats move on."""
+    if state is None:
+        return False
+    limit = _relative_limit(state.last_day, benchmark)
+    if np.isnat(state.relative_day):
+        return limit >= state.days[0]
+    return limit > state.relative_day
+
+
+def _update_relative(relative, days, values, count, benchmark):
+    """Move the rolling-return and alpha/beta stats on to the rows in
+    (relative_day, limit] of the tail `days` / `values`, whose last row
+    is absolute row `count - 1`."""
+    relative = dict(relative)
+    relative['benchmark'] = benchmark.key if benchmark is not None else None
+    lo = 0 if np.isnat(relative['relative_day']) else int(np.searchsorted(days, relative['relative_day'], side='right'))
+    hi = int(np.searchsorted(days, _relative_limit(days[-1], benchmark), side='right'))
+    rows = np.arange(lo, hi)
+    has_benchmark = benchmark is not None and len(benchmark.dates) > 0
+    if has_benchmark:
+        bench_rows = np.searchsorted(benchmark.dates, days[rows])
+        shared = bench_rows < len(benchmark.dates)
+        shared[shared] = benchmark.dates[bench_rows[shared]] == days[rows][shared]
+        rows, bench_rows = rows[shared], bench_rows[shared]
+    if len(rows) == 0:
+        if hi > lo:
+            relative['relative_day'] = days[hi - 1]
+        return relative
+
+    base = count - len(days)
+    anchors, rolling, both, beats = relative['anchors'].copy(), list(relative['rolling']), relative['both'].copy(), relative['beats'].copy()
+    for i, window in enumerate(ROLLING_WINDOWS):
+        months = rolling_returns.ROLLING_WINDOWS[window]
+        # Anchors only move forward, so the search starts at the last one
+        start = max(int(anchors[i]) - base, 0)
+        found = start + np.searchsorted(days[start:], rolling_returns.shift_months(days[rows], months), side='right') - 1
+        ok = found >= 0
+        fund = np.full(len(rows), np.nan)
+        growth = values[rows[ok]] / values[found[ok]]
+        if months >= rolling_returns.ANNUALIZE_FROM_MONTHS:
+            growth = growth ** (12.0 / months)
+        fund[ok] = (growth - 1) * 100
+        anchors[i] = found[-1] + base if found[-1] >= 0 else -1
+        sample = fund[~np.isnan(fund)]
+        if len(sample):
+            rolling[i] = np.insert(rolling[i], np.searchsorted(rolling[i], np.sort(sample)), np.sort(sample))
+        if has_benchmark:
+            bench = benchmark.rolling[window][bench_rows]
+            paired = ~np.isnan(fund) & ~np.isnan(bench)
+            both[i] += int(paired.sum())
+            beats[i] += int((fund[paired] > bench[paired]).sum())
+
+    if has_benchmark:
+        # Daily returns between consecutive shared dates, as aligned_returns.align gives them
+        pair_last, sums = relative['pair_last'], relative['pair_sums'].copy()
+        fund_levels = np.concatenate([pair_last[:1], values[rows]])
+        bench_levels = np.concatenate([pair_last[1:], benchmark.closes[bench_rows]])
+        if np.isnan(pair_last[0]):
+            fund_levels, bench_levels = fund_levels[1:], bench_levels[1:]
+        f = fund_levels[1:] / fund_levels[:-1] - 1
+        b = bench_levels[1:] / bench_levels[:-1] - 1
+        sums += [len(f), f.sum(), b.sum(), (f * f).sum(), (b * b).sum(), (f * b).sum()]
+        relative['pair_last'] = np.array([fund_levels[-1], bench_levels[-1]])
+        relative['pair_sums'] = sums
+
+    relative.update(anchors=anchors, rolling=tuple(rolling), both=both, beats=beats, relative_day=days[hi - 1])
+    return relative
+
+
+def metrics(state):
+    """Scalar metrics from the state, named like the universe table columns."""
+    days, navs = state.days, state.navs
+    row = {}
+    # The tail starts at or before every horizon's start when the history
+    # reaches that far, so strict anchors on it match the full history
+    returns = period_returns.trailing_returns(days, navs, RETURN_HORIZONS, strict=True)
+    cagr = period_returns.trailing_cagr(days, navs, CAGR_HORIZONS, strict=True)
+    if state.count > 1:
+        returns['SI'] = (navs[-1] / state.first_nav - 1) * 100
+        years = (days[-1] - state.first_day) / _DAY / 365.0
+        cagr['SI'] = ((navs[-1] / state.first_nav) ** (1.0 / years) - 1) * 100 if years > 0 else None
+    row.update({f"return_{h.lower()}": np.nan if v is None else float(v) for h, v in returns.items()})
+    row.update({f"cagr_{h.lower()}": np.nan if v is None else float(v) for h, v in cagr.items()})
+
+    n = state.count - 1
+    row['volatility'] = float(_std(state.csum[-1], state.csq[-1], n) * np.sqrt(TRADING_DAYS) * 100) if n > 1 else np.nan
+    lo = max(period_returns.window_start(days, 365) - 1, 0)
+    n_recent = len(days) - 1 - lo
+    row['volatility_1y'] = (
+        float(_std(state.csum[-1] - state.csum[lo], state.csq[-1] - state.csq[lo], n_recent) * np.sqrt(TRADING_DAYS) * 100)
+        if n_recent > 1 else np.nan
+    )
+    row['avg_volatility_30d'] = state.vol_sum / state.vol_count if state.vol_count else np.nan
+
+    row['max_drawdown'] = state.max_drawdown * 100
+    row['current_drawdown'] = (navs[-1] / state.peak - 1) * 100
+    underwater = state.episodes.underwater_days
+    row['longest_drawdown_days'] = float(underwater.max()) if len(underwater) else 0.0
+
+    has_benchmark = state.benchmark is not None
+    for i, window in enumerate(ROLLING_WINDOWS):
+        key = window.lower()
+        sample = state.rolling[i]
+        # With a benchmark a window counts only once both series have a return in it
+        empty = len(sample) == 0 or (has_benchmark and state.both[i] == 0)
+        row[f"rolling_{key}_median"] = np.nan if empty else float(np.median(sample))
+        row[f"rolling_{key}_beat_pct"] = state.beats[i] / state.both[i] * 100 if has_benchmark and state.both[i] else np.nan
+    row['alpha'], row['beta'] = _alpha_beta(state.pair_sums) if has_benchmark else (np.nan, np.nan)
+    return row
+
+
+def _alpha_beta(sums):
+    """Annualized alpha (%) and beta from running sums of daily returns."""
+    n, sf, sb, sff, sbb, sfb = sums
+    if n < 2:
+        return np.nan, np.nan
+    variance = sbb - sb * sb / n
+    if variance <= 0:
+        return np.nan, np.nan
+    beta = (sfb - sf * sb / n) / variance
+    alpha = (sf / n - beta * sb / n) * TRADING_DAYS * 100
+    return float(alpha), float(beta)
+
+
+def to_bytes(state):
+    episodes = state.episodes
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        first_day=state.first_day, first_nav=state.first_nav, count=state.count,
+        days=state.days, navs=state.navs, csum=state.csum, csq=state.csq,
+        peak=state.peak, max_drawdown=state.max_drawdown,
+        vol_sum=state.vol_sum, vol_count=state.vol_count,
+        ep_peak=episodes.peak, ep_trough=episodes.trough, ep_recovery=episodes.recovery,
+        ep_depth=episodes.depth, ep_last_day=episodes.last_day, ep_peak_value=episodes.peak_value,
+        ep_trough_value=np.nan if episodes.trough_value is None else episodes.trough_value,
+        benchmark=state.benchmark or "", relative_day=state.relative_day,
+        anchors=state.anchors, both=state.both, beats=state.beats,
+        pair_last=state.pair_last, pair_sums=state.pair_sums,
+        **{f"rolling_{i}": sample for i, sample in enumerate(state.rolling)},
+    )
+    return buffer.getvalue()
+
+
+def from_bytes(blob):
+    with np.load(io.BytesIO(blob)) as data:
+        trough_value = float(data['ep_trough_value'])
+        episodes = drawdown_episodes.DrawdownEpisodes(
+            data['ep_peak'], data['ep_trough'], data['ep_recovery'], data['ep_depth'],
+            data['ep_last_day'][()], float(data['ep_peak_value']),
+            None if np.isnan(trough_value) else trough_value,
+        )
+        return AnalyticsState(
+            first_day=data['first_day'][()], first_nav=float(data['first_nav']), count=int(data['count']),
+            days=data['days'], navs=data['navs'], csum=data['csum'], csq=data['csq'],
+            peak=float(data['peak']), max_drawdown=float(data['max_drawdown']),
+            vol_sum=float(data['vol_sum']), vol_count=int(data['vol_count']),
+            episodes=episodes,
+            benchmark=str(data['benchmark']) or None, relative_day=data['relative_day'][()],
+            anchors=data['anchors'], rolling=tuple(data[f"rolling_{i}"] for i in range(len(ROLLING_WINDOWS))),
+            both=data['both'], beats=data['beats'], pair_last=data['pair_last'], pair_sums=data['pair_sums'],
+        )
+
+
+def connect():
+    conn = nav_store.connect()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def refresh_state(scheme_code, benchmark=None, conn=None):
+    """Bring a scheme's stored state up to date with its stored NAVs and
+    `benchmark` (a Benchmark or None).
+
+    Only NAV rows after the state's last day are read, so the usual daily
+    refresh reads a single row; a state kept against another benchmark is
+    rebuilt from the full history. Returns the state, or None with no NAVs.
+    """
+    scheme_code = int(scheme_code)
+    own = conn is None
+    conn = conn or connect()
+    try:
+        row = conn.execute(
+            "SELECT state FROM analytics_state WHERE scheme_code = ?", (scheme_code,)
+        ).fetchone()
+        state = from_bytes(row[0]) if row else None
+        if state is not None and state.benchmark != (benchmark.key if benchmark is not None else None):
+            state = None
+        after = int(state.last_day.astype(np.int64)) if state is not None else -(1 << 62)
+        rows = conn.execute(
+            "SELECT day, nav FROM nav WHERE scheme_code = ? AND day > ? ORDER BY day", (scheme_code, after)
+        ).fetchall()
+        if not rows and not _benchmark_ahead(state, benchmark):
+            return state
+        table = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        updated = update(state, table[:, 0].astype(np.int64).astype('datetime64[D]'), table[:, 1], benchmark)
+        if updated is None or updated is state:
+            return state
+        state = updated
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analytics_state (scheme_code, last_day, state) VALUES (?, ?, ?)",
+                (scheme_code, int(state.last_day.astype(np.int64)), to_bytes(state)),
+            )
+        return state
+    finally:
+        if own:
+            conn.close()
@@ -0,0 +1,255 @@
+"""Timing spans and cache counters for the app's hot paths.
+
+    with instrumentation.span("nav_store.sync", scheme=code):
+        ...
+    instrumentation.count_cache("report", hit=html is not None)
+
+Every finished span goes into a process-wide latency histogram, is logged
+as one logfmt line on the "instrumentation" logger (DEBUG, or INFO when
+slower than SLOW_SPAN_MS) and is collected for the current script run, so
+the app can show where a rerun spent its time. prometheus_text() renders
+the histograms and counters in the Prometheus text format and
+serve_metrics() exposes them over HTTP. Standard library only.
+"""
+import contextvars
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("instrumentation")
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Spans slower than this are logged at INFO rather than DEBUG
+SLOW_SPAN_MS = 250
+METRIC_PREFIX = "mfa"
+
+_lock = threading.Lock()
+_histograms = {}
+_cache_counts = {}
+
+# Spans of the script run in progress on this thread, and the nesting depth
+_run = contextvars.ContextVar("instrumentation_run", default=None)
+_depth = contextvars.ContextVar("instrumentation_depth", default=0)
+# Set by the body of a memoized function so the caller can tell a miss
+_cache_miss = contextvars.ContextVar("instrumentation_cache_miss", default=None)
+
+
+@dataclass
+class _Histogram:
+    buckets: list = field(default_factory=lambda: [0] * len(BUCKETS))
+    count: int = 0
+    total: float = 0.0
+
+
+@dataclass(frozen=True)
+class SpanRecord:
+    name: str
+    depth: int
+    # Offset from the start of the run
+    start_ms: float
+    duration_ms: float
+    fields: dict
+
+
+@dataclass
+class Run:
+    """Spans recorded during one script run, in the order they finished."""
+    started: float = field(default_factory=time.perf_counter)
+    spans: list = field(default_factory=list)
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def _logfmt(values):
+    parts = []
+    for key, value in values.items():
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        value = str(value)
+        if not value or any(c in value for c in ' ="'):
+            value = '"' + value.replace('"', '\\"') + '"'
+        parts.append(f"{key}={value}")
+    return " ".join(parts)
+
+
+def record(name, seconds, **fields):
+    """Add a duration measured elsewhere (e.g. in a worker process) to the
+    histogram for `name` and log it."""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = _Histogram()
+        index = bisect_left(BUCKETS, seconds)
+        if index < len(BUCKETS):
+            histogram.buckets[index] += 1
+        histogram.count += 1
+        histogram.total += seconds
+    duration_ms = seconds * 1000
+    level = logging.INFO if duration_ms >= SLOW_SPAN_MS else logging.DEBUG
+    if logger.isEnabledFor(level):
+        logger.log(level, _logfmt({'span': name, 'duration_ms': duration_ms, **fields}))
+
+
+class span:
+    """Context manager (or decorator) timing a block under `name`.
+
+    Keyword arguments are logged with the span but are not metric labels,
+    so they may have high cardinality (scheme codes, row counts).
+    """
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self._depth_token = _depth.set(_depth.get() + 1)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        depth = _depth.get() - 1
+        _depth.reset(self._depth_token)
+        fields = self.fields if exc_type is None else {**self.fields, 'error': exc_type.__name__}
+        record(self.name, seconds, **fields)
+        run = _run.get()
+        if run is not None:
+            start_ms = (self._start - run.started) * 1000
+            run.spans.append(SpanRecord(self.name, depth, start_ms, seconds * 1000, fields))
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(self.name, **self.fields):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def count_cache(name, hit):
+    with _lock:
+        counts = _cache_counts.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+
+
+def cached(name, cache_decorator):
+    """Apply a memoizing decorator such as st.cache_data(ttl=60) to a
+    function, counting calls served without running its body as hits."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def body(*args, **kwargs):
+            flag = _cache_miss.get()
+            if flag is not None:
+                flag.append(True)
+            return fn(*args, **kwargs)
+
+        memoized = cache_decorator(body)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            flag = []
+            token = _cache_miss.set(flag)
+            try:
+                with span(f"cache.{name}"):
+                    return memoized(*args, **kwargs)
+            finally:
+                _cache_miss.reset(token)
+                count_cache(name, hit=not flag)
+
+        wrapper.clear = getattr(memoized, 'clear', None)
+        return wrapper
+    return decorate
+
+
+def start_run():
+    """Begin collecting the spans of a new script run on this thread."""
+    run = Run()
+    _run.set(run)
+    return run
+
+
+def finish_run(run, **fields):
+    """Log a one-line summary of a script run and return it."""
+    total = {}
+    for item in run.spans:
+        if item.depth == 0:
+            total[item.name] = total.get(item.name, 0.0) + item.duration_ms
+    slowest = max(total, key=total.get) if total else ""
+    logger.info(_logfmt({
+        'event': "script_run", 'duration_ms': run.elapsed_ms, 'spans': len(run.spans),
+        'slowest': slowest, 'slowest_ms': total.get(slowest, 0.0), **fields,
+    }))
+    return run
+
+
+def cache_stats():
+    """{cache name: (hits, misses)}"""
+    with _lock:
+        return {name: tuple(counts) for name, counts in sorted(_cache_counts.items())}
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    """Every histogram and counter in the Prometheus text exposition format."""
+    span_metric = f"{METRIC_PREFIX}_span_duration_seconds"
+    cache_metric = f"{METRIC_PREFIX}_cache_requests_total"
+    lines = [
+        f"# HELP {span_metric} Time spent in instrumented spans.",
+        f"# TYPE {span_metric} histogram",
+    ]
+    with _lock:
+        histograms = {name: (list(h.buckets), h.count, h.total) for name, h in sorted(_histograms.items())}
+        counts = {name: tuple(c) for name, c in sorted(_cache_counts.items())}
+    for name, (buckets, count, total) in histograms.items():
+        label = f'span="{_escape(name)}"'
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f'{span_metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'{span_metric}_bucket{{{label},le="+Inf"}} {count}')
+        lines.append(f"{span_metric}_sum{{{label}}} {total:.6f}")
+        lines.append(f"{span_metric}_count{{{label}}} {count}")
+    lines += [
+        f"# HELP {cache_metric} Cache lookups by result.",
+        f"# TYPE {cache_metric} counter",
+    ]
+    for name, (hits, misses) in counts.items():
+        label = f'cache="{_escape(name)}"'
+        lines.append(f'{cache_metric}{{{label},result="hit"}} {hits}')
+        lines.append(f'{cache_metric}{{{label},result="miss"}} {misses}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent; keep them out of the application log
+        pass
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serve /metrics on a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Serving metrics on %s:%d/metrics", host, port)
+    return server
@@ -0,0 +1,21 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Return module `name`, deferring its execution to the first attribute access.
+
+    Parent packages are still imported right away; only the named module's
+    own code (and whatever it imports) waits until it is actually used.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,120 @@
+"""Shared HTTP client for mfapi.in.
+
+All requests go through one pooled session with bounded timeouts and
+retries. Identical requests made at the same time (several sessions
+opening the same fund) are coalesced into a single upstream call, and
+after repeated failures the client fails fast for a while instead of
+tying up every caller in timeouts.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import instrumentation
+
+MFAPI_URL = "https://api.mfapi.in/mf"
+
+# (connect, read) timeouts in seconds for a single attempt
+TIMEOUT = (5, 15)
+# Retries with exponential backoff (0.5 s, 1 s) on connection errors and
+# overload responses; Retry-After from the server is honoured
+RETRY = Retry(
+    total=2,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+POOL_SIZE = 32
+
+# Consecutive failed requests before the client stops calling upstream,
+# and how long it then fails fast before trying again
+FAILURE_THRESHOLD = 5
+COOLDOWN_SECONDS = 30
+
+
+class UpstreamUnavailable(requests.ConnectionError):
+    """Raised without a request while mfapi.in is considered down."""
+
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=RETRY))
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+_failures = 0
+_open_until = 0.0
+_breaker_lock = threading.Lock()
+
+
+def _check_breaker():
+    if time.monotonic() < _open_until:
+        raise UpstreamUnavailable("mfapi.in is unavailable, retrying shortly")
+
+
+def _record(success):
+    global _failures, _open_until
+    with _breaker_lock:
+        if success:
+            _failures = 0
+            return
+        _failures += 1
+        if _failures >= FAILURE_THRESHOLD:
+            _open_until = time.monotonic() + COOLDOWN_SECONDS
+            _failures = 0
+
+
+def _fetch(url, params, headers):
+    _check_breaker()
+    try:
+        with instrumentation.span("mfapi.fetch", url=url):
+            response = _session.get(url, params=params, headers=headers, timeout=TIMEOUT)
+    except (requests.ConnectionError, requests.Timeout):
+        _record(False)
+        raise
+    _record(response.status_code < 500)
+    if response.status_code != 304:
+        response.raise_for_status()
+    # Read the body here so every waiter shares the loaded content
+    response.content
+    return response
+
+
+def _coalesced(key, fetch):
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    # A request joining one already in flight counts as a coalescing hit
+    instrumentation.count_cache("mfapi.coalesced", hit=not leader)
+    if not leader:
+        return future.result()
+    try:
+        result = fetch()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+
+def get(path="", params=None, headers=None):
+    """GET `MFAPI_URL/path` and return the response (status 200 or 304).
+
+    Raises requests.HTTPError for error statuses and other
+    requests.RequestException subclasses when mfapi.in can't be reached.
+    """
+    url = f"{MFAPI_URL}/{path}" if path else MFAPI_URL
+    key = (url, tuple(sorted((params or {}).items())), tuple(sorted((headers or {}).items())))
+    return _coalesced(key, lambda: _fetch(url, params, headers))
@@ -1,18 +1,39 @@
 import streamlit as st
 import pandas as pd
 import requests
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import time
-from io import StringIO
-import json
-import yfinance as yf
-from quant_report import create_report
-import tempfile
+import report_jobs
+import quant_report
+import nav_store
+import fund_list
+import nav_ingest
+import benchmark_library
+import analytics
+import rolling_returns
+import chart_downsample
+import fund_compare
+import precompute_universe
+import peer_ranking
+import instrumentation
+from fund_search import FundSearchIndex
+from lazy_import import lazy_import
 import os
+import logging
+import uuid
 import streamlit.components.v1 as components
 
+# Plotting libraries load on the first chart drawn rather than at startup
+px = lazy_import("plotly.express")
+go = lazy_import("plotly.graph_objects")
+
+# Timing spans of this script run, shown in the debug panel and logged at the end
+script_run = instrumentation.start_run()
+
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s %(message)s"
+)
+logger = logging.getLogger("mutual_fund_analyzer")
+
 
 # Set page configuration
 st.set_page_config(
@@ -21,60 +42,179 @@ st.set_page_config(
     layout="wide"
 )
 
-# Function to get all mutual funds
-@st.cache_data(ttl=3600)  # Cache the data for 1 hour
+# Per-rerun timings and cache counters in the sidebar, with ?debug=1 in the
+# URL or MFA_DEBUG=1 in the environment
+DEBUG_PANEL = os.environ.get("MFA_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
+# Prometheus metrics on METRICS_PORT (once per process) when it is set
+@st.cache_resource
+def start_metrics_server():
+    port = os.environ.get("METRICS_PORT")
+    if not port:
+        return None
+    try:
+        return instrumentation.serve_metrics(int(port))
+    except OSError as e:
+        logger.warning("Metrics server not started on port %s: %s", port, e)
+        return None
+
+# Scheme list snapshot, kept on disk and shared by all sessions of the
+# process; it is only re-downloaded when mfapi.in reports a change
 def get_all_funds():
     try:
-        response = requests.get("https://api.mfapi.in/mf")
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Failed to fetch data: {response.status_code}")
-            return []
+        return fund_list.get_fund_list()
+    except requests.HTTPError as e:
+        st.error(f"Failed to fetch data: {e.response.status_code}")
+        return None
     except Exception as e:
         st.error(f"Error fetching fund list: {e}")
-        return []
+        return None
+
+# Search index over the fund list, shared by all sessions and rebuilt only
+# when the list itself changes
+@instrumentation.cached("fund_index", st.cache_resource(max_entries=2))
+def get_fund_index(version, _funds):
+    return FundSearchIndex(_funds.codes, _funds.names)
+
+# Maximum number of suggestions offered in the select box
+MAX_SUGGESTIONS = 50
+
+# Limits for the multi-fund comparison
+MAX_COMPARE_OPTIONS = 200
+MAX_COMPARE_FUNDS = 50
 
 # Function to get fund details by scheme code
-@st.cache_data(ttl=1800)  # Cache the data for 30 minutes
+# NAV history is kept in the on-disk store and only the new tail is fetched
+# from mfapi.in, so cold starts and cache expiry are served from disk
+@instrumentation.cached("fund_details", st.cache_data(ttl=1800))  # Cache the data for 30 minutes
 def get_fund_details(scheme_code):
     try:
-        response = requests.get(f"https://api.mfapi.in/mf/{scheme_code}")
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Failed to fetch fund details: {response.status_code}")
-            return None
+        scheme = nav_store.get_scheme(scheme_code)
+        return {
+            'meta': scheme['meta'],
+            'nav': nav_ingest.nav_frame(scheme['dates'], scheme['navs'])
+        }
     except Exception as e:
         st.error(f"Error fetching fund details: {e}")
         return None
 
-# Function to get benchmark data from Yahoo Finance
-@st.cache_data(ttl=3600)  # Cache the data for 1 hour
-def get_benchmark_data(start_date, end_date, ticker="^BSESN"):
+# Prefetch every library benchmark into the local store once per process,
+# in the background, so switching benchmarks never waits on the network
+@st.cache_resource
+def prefetch_benchmarks():
+    return benchmark_library.prefetch_in_background()
+
+# Function to get the benchmark history, reporting failures on the page
+# Histories are served from memory or the local store and refreshed in the
+# background; only a benchmark never fetched before is downloaded first
+def load_benchmark_history(benchmark_key):
     try:
-        # Convert dates to the format yfinance expects
-        start_date_str = start_date.strftime('%Y-%m-%d')
-        end_date_str = (end_date + timedelta(days=1)).strftime('%Y-%m-%d')  # Add one day to include end_date
-        
-        # Download benchmark data
-        benchmark_data = yf.download(ticker, start=start_date_str, end=end_date_str)
-        
-        if benchmark_data.empty:
-            st.warning(f"No benchmark data available for {ticker} in the specified date range.")
-            return None
-            
-        # Reset index to make 'Date' a column
-        benchmark_data = benchmark_data.reset_index()
-        
-        # Keep only the necessary columns
-        benchmark_data = benchmark_data[['Date', 'Close']]
-        benchmark_data.columns = ['date', 'close']
-        
-        return benchmark_data
+        history = benchmark_library.get_history(benchmark_key)
     except Exception as e:
         st.error(f"Error fetching benchmark data: {e}")
         return None
+    
+    if history.empty:
+        st.warning(f"No benchmark data available for {benchmark_library.BENCHMARKS[benchmark_key].name}.")
+        return None
+    
+    return history
+
+# Identifies the data a cached analytics snapshot was built from
+def data_version(frame):
+    if frame is None or frame.empty:
+        return None
+    last_date = frame.index[-1] if 'date' not in frame else frame['date'].iloc[-1]
+    return (len(frame), str(last_date))
+
+# Analytics snapshot shared by every section of the page; computed once per
+# (scheme, benchmark, data version) rather than on every rerun. Frames are
+# passed with a leading underscore so Streamlit does not hash them
+@instrumentation.cached("fund_analytics", st.cache_resource(ttl=1800, max_entries=64))
+def get_fund_analytics(scheme_code, benchmark_ticker, version, _nav_frame, _benchmark_history):
+    return analytics.build_analytics(_nav_frame, _benchmark_history)
+
+# Histories for several funds, fetched concurrently and aligned into one
+# date x scheme matrix
+@instrumentation.cached("fund_comparison", st.cache_data(ttl=1800))
+def get_fund_comparison(scheme_codes):
+    schemes, errors = fund_compare.fetch_schemes(scheme_codes)
+    series = {code: (scheme['dates'], scheme['navs']) for code, scheme in schemes.items()}
+    dates, matrix, keys = fund_compare.build_nav_matrix(series)
+    return dates, matrix, keys, fund_compare.observed_mask(dates, series, keys), errors
+
+# Metrics and percentiles of every stored scheme in a category, rebuilt only
+# when a member's stored NAVs or the NAV matrix change (the version);
+# ranking a fund within its category is then a lookup
+@instrumentation.cached("peer_group", st.cache_resource(ttl=3600, max_entries=16))
+def get_peer_group(scheme_category, version):
+    return peer_ranking.load_peer_group(scheme_category)
+
+# Whole-universe metrics table built offline by precompute_universe.py;
+# keyed on the file's modification time so a new run is picked up
+@instrumentation.cached("universe_metrics", st.cache_data(ttl=3600))
+def load_universe_metrics(modified_time):
+    universe = pd.read_parquet(precompute_universe.OUTPUT_PATH)
+    return universe[universe['error'].isna()].drop(columns=['error'])
+
+# Line trace with the series reduced to a bounded number of points, so the
+# chart payload stays the same size however long the history is
+def line_trace(x, y, **kwargs):
+    with instrumentation.span("chart.trace", rows=len(x)):
+        x, y = chart_downsample.downsample(x, y)
+        return go.Scatter(x=x, y=y, mode='lines', **kwargs)
+
+# Send a chart to the page, timing its serialization under `name`
+def show_chart(name, fig):
+    with instrumentation.span(f"chart.{name}"):
+        st.plotly_chart(fig, use_container_width=True)
+
+# Columns the fund screener can rank by
+SCREENER_COLUMNS = {
+    "1-Year Return": 'return_1y',
+    "3-Year CAGR": 'cagr_3y',
+    "5-Year CAGR": 'cagr_5y',
+    "Alpha": 'alpha',
+    "1-Year Rolling Median": 'rolling_1y_median',
+    "Volatility (1 Year)": 'volatility_1y',
+    "Max Drawdown": 'max_drawdown'
+}
+
+# Rolling risk metrics in the volatility tab: label -> (metric, unit)
+RISK_METRICS = {
+    "Volatility": ('volatility', "%"),
+    "Downside Deviation": ('downside_deviation', "%"),
+    "Sharpe Ratio": ('sharpe', ""),
+    "Sortino Ratio": ('sortino', ""),
+    "Beta": ('beta', ""),
+    "Tracking Error": ('tracking_error', "%"),
+}
+RISK_WINDOW_LABELS = {'30D': "30-Day", '3M': "3-Month", '6M': "6-Month", '1Y': "1-Year"}
+
+# Drawdown episodes listed per series in the drawdown tab
+MAX_DRAWDOWN_EPISODES = 5
+
+# Display formats for the headline tear-sheet statistics
+HEADLINE_FORMATS = {
+    'CAGR': "{:.2%}",
+    'Sharpe': "{:.2f}",
+    'Sortino': "{:.2f}",
+    'Calmar': "{:.2f}",
+    'Max Drawdown': "{:.2%}",
+    'Max Drawdown Duration': "{:.0f} days",
+    'Alpha': "{:.2%}",
+    'Beta': "{:.2f}",
+    'Information Ratio': "{:.3f}",
+    'Up Capture': "{:.2f}",
+    'Down Capture': "{:.2f}"
+}
+
+# Display names for the rolling return windows
+ROLLING_LABELS = {'1M': "1-Month", '3M': "3-Month", '6M': "6-Month", '1Y': "1-Year", '3Y': "3-Year"}
+
+# Start filling the local benchmark store (once per process)
+prefetch_benchmarks()
+start_metrics_server()
 
 # Main app header
 st.title("Mutual Fund Analyzer")
@@ -84,41 +224,41 @@ st.markdown("---")
 with st.container():
     st.subheader("Step 1: Search for a Mutual Fund")
     
-    # Initialize or get session state for funds
-    if 'all_funds' not in st.session_state:
-        with st.spinner("Loading all mutual funds..."):
-            st.session_state.all_funds = get_all_funds()
+    # Load the shared fund search index
+    with st.spinner("Loading all mutual funds..."):
+        all_funds = get_all_funds()
+        if all_funds is not None:
+            fund_index = get_fund_index(all_funds.version, all_funds)
+        else:
+            fund_index = FundSearchIndex([], [])
     
     # Search functionality
     search_term = st.text_input("Type to search for a fund:", key="search_box")
     
     if search_term:
-        print("*" * 100)
-        print(f'Search Query {search_term}')
-        # Filter funds based on search term (case-insensitive)
-        filtered_funds = [
-            fund for fund in st.session_state.all_funds
-            if search_term.lower() in fund['schemeName'].lower()
-        ]
+        # Look up ranked matches in the search index
+        with instrumentation.span("search"):
+            total_matches = fund_index.count(search_term)
+            filtered_funds = fund_index.search(search_term, limit=MAX_SUGGESTIONS)
+        logger.debug("search query=%r matches=%d", search_term, total_matches)
         
         # Display total matches
         if filtered_funds:
-            st.info(f"Found {len(filtered_funds)} matches")
+            if total_matches > len(filtered_funds):
+                st.info(f"Found {total_matches} matches, showing the top {len(filtered_funds)}")
+            else:
+                st.info(f"Found {total_matches} matches")
             
-            # Create a selection box for filtered funds
-            fund_names = [f"{fund['schemeName']} (Code: {fund['schemeCode']})" for fund in filtered_funds]
-            selected_fund_name = st.selectbox("Select a fund:", fund_names)
+            # Create a selection box for the top matches
+            selected_fund = st.selectbox(
+                "Select a fund:",
+                filtered_funds,
+                format_func=lambda fund: f"{fund[1]} (Code: {fund[0]})"
+            )
             
-            # Extract the selected scheme code
-            if selected_fund_name:
-                selected_scheme_code = int(selected_fund_name.split("(Code: ")[1].split(")")[0])
-                
-                # Set session state for selected fund
-                st.session_state.selected_scheme_code = selected_scheme_code
-                st.session_state.selected_fund_name = next(
-                    (fund['schemeName'] for fund in filtered_funds if fund['schemeCode'] == selected_scheme_code),
-                    "Unknown Fund"
-                )
+            # Set session state for selected fund
+            if selected_fund:
+                st.session_state.selected_scheme_code, st.session_state.selected_fund_name = selected_fund
         else:
             st.warning("No funds match your search term.")
     else:
@@ -126,7 +266,7 @@ with st.container():
 
 # Step 2 & 3: Display fund details if a fund is selected
 if 'selected_scheme_code' in st.session_state:
-    print(f'Selected fund {st.session_state.selected_fund_name}')
+    logger.debug("selected scheme=%s", st.session_state.selected_scheme_code)
     st.markdown("---")
     st.subheader(f"Step 2 & 3: Fund Details - {st.session_state.selected_fund_name}")
     
@@ -158,63 +298,49 @@ if 'selected_scheme_code' in st.session_state:
         st.markdown("---")
         st.subheader("Step 4: Historical NAV Analysis")
         
-        # Get NAV data
-        nav_data = fund_details.get('data', [])
+        # Get NAV data (typed, sorted and indexed by date at ingestion)
+        nav_frame = fund_details['nav']
         
-        if nav_data:
-            # Convert to DataFrame
-            df = pd.DataFrame(nav_data)
-            
-            # Convert date strings to datetime objects
-            df['date'] = pd.to_datetime(df['date'], format='%d-%m-%Y')
+        if not nav_frame.empty:
+            # Benchmark for all comparisons, defaulting to the index that
+            # matches the scheme category
+            benchmark_keys = list(benchmark_library.BENCHMARKS)
+            default_benchmark = benchmark_library.for_category(meta.get('scheme_category'))
+            benchmark_key = st.selectbox(
+                "Benchmark:",
+                benchmark_keys,
+                index=benchmark_keys.index(default_benchmark),
+                format_func=lambda key: benchmark_library.BENCHMARKS[key].name,
+                key=f"benchmark_{st.session_state.selected_scheme_code}"
+            )
+            benchmark_name = benchmark_library.BENCHMARKS[benchmark_key].name
             
-            # Convert NAV to float
-            df['nav'] = df['nav'].astype(float)
+            # Load the benchmark history and the shared analytics snapshot
+            with st.spinner(f"Loading benchmark data ({benchmark_name})..."):
+                benchmark_history = load_benchmark_history(benchmark_key)
             
-            # Sort by date (ascending)
-            df = df.sort_values('date')
+            fund_analytics = get_fund_analytics(
+                st.session_state.selected_scheme_code,
+                benchmark_key,
+                (data_version(nav_frame), data_version(benchmark_history)),
+                nav_frame,
+                benchmark_history
+            )
+            df = fund_analytics.fund
             
             # Display statistics in the second column
             with col2:
                 st.markdown("### Performance Statistics")
                 
-                # Calculate basic statistics
-                latest_nav = df['nav'].iloc[-1]
-                start_nav = df['nav'].iloc[0]
-                
-                # Calculate returns for different periods
+                # Show returns for different periods
                 if len(df) > 1:
-                    latest_date = df['date'].iloc[-1]
-                    
-                    # 1-day return (if available)
-                    if len(df) >= 2:
-                        one_day_return = ((df['nav'].iloc[-1] / df['nav'].iloc[-2]) - 1) * 100
-                    else:
-                        one_day_return = 0
-                    
-                    # 1-week return (approx. 7 days)
-                    week_df = df[df['date'] >= (latest_date - pd.Timedelta(days=7))]
-                    if len(week_df) > 0:
-                        one_week_return = ((latest_nav / week_df['nav'].iloc[0]) - 1) * 100
-                    else:
-                        one_week_return = None
-                    
-                    # 1-month return (approx. 30 days)
-                    month_df = df[df['date'] >= (latest_date - pd.Timedelta(days=30))]
-                    if len(month_df) > 0:
-                        one_month_return = ((latest_nav / month_df['nav'].iloc[0]) - 1) * 100
-                    else:
-                        one_month_return = None
-                    
-                    # 1-year return (approx. 365 days)
-                    year_df = df[df['date'] >= (latest_date - pd.Timedelta(days=365))]
-                    if len(year_df) > 0:
-                        one_year_return = ((latest_nav / year_df['nav'].iloc[0]) - 1) * 100
-                    else:
-                        one_year_return = None
-                    
-                    # Total return since beginning of available data
-                    total_return = ((latest_nav / start_nav) - 1) * 100
+                    period_returns = fund_analytics.period_returns
+                    latest_nav = period_returns['latest_nav']
+                    one_day_return = period_returns['1d']
+                    one_week_return = period_returns['1w']
+                    one_month_return = period_returns['1m']
+                    one_year_return = period_returns['1y']
+                    total_return = period_returns['total']
                     
                     # Create DataFrame for returns
                     returns_df = pd.DataFrame([
@@ -224,11 +350,30 @@ if 'selected_scheme_code' in st.session_state:
                         {"Period": "1-Month Return", "Value": f"{one_month_return:.2f}%" if one_month_return is not None else "N/A"},
                         {"Period": "1-Year Return", "Value": f"{one_year_return:.2f}%" if one_year_return is not None else "N/A"},
                         {"Period": "Total Return", "Value": f"{total_return:.2f}%"},
-                        {"Period": "Date Range", "Value": f"{df['date'].iloc[0].date()} to {df['date'].iloc[-1].date()}"}
+                        {"Period": "Date Range", "Value": f"{period_returns['start_date'].date()} to {period_returns['end_date'].date()}"}
                     ])
                     
                     st.table(returns_df)
             
+            # Where the fund ranks among the stored schemes of its category
+            scheme_category = meta.get('scheme_category')
+            if scheme_category:
+                st.markdown(f"### Category Peer Ranking ({scheme_category})")
+                peer_group = get_peer_group(scheme_category, peer_ranking.group_version(scheme_category))
+                if len(peer_group) > 1 and st.session_state.selected_scheme_code in peer_group:
+                    st.caption(
+                        f"Against {len(peer_group)} schemes with current NAVs, as of {peer_group.as_of}. "
+                        "Percentile 100 is the best in the category."
+                    )
+                    st.dataframe(
+                        peer_group.fund_table(st.session_state.selected_scheme_code).round(2),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                else:
+                    st.info("Not enough schemes of this category in the local store to rank against. "
+                            "Run precompute_universe.py to sync the fund universe.")
+            
             # Time period selection for the graph
             time_periods = {
                 "1 Month": 30,
@@ -245,70 +390,55 @@ if 'selected_scheme_code' in st.session_state:
                                            index=3)# Index 3 corresponds to "1 Year"
             days = time_periods[selected_period]
             
-            if days:
-                filtered_df = df[df['date'] >= (df['date'].max() - pd.Timedelta(days=days))]
-            else:
-                filtered_df = df
-            
-            # Get benchmark data for comparison
-            benchmark_ticker = "BSE-500.BO"  # BSE 500 Index
+            # Slice the fund and benchmark series for the selected period; the
+            # raw rows feed the NAV chart and downloads, the aligned window
+            # (fund and benchmark on their common dates) every comparison
+            filtered_df, benchmark_data = fund_analytics.window(days)
+            aligned_period = fund_analytics.aligned.trailing(days) if fund_analytics.has_benchmark else None
             
             # Get start and end dates from the filtered dataframe
             start_date = filtered_df['date'].min()
             end_date = filtered_df['date'].max()
-            
-            with st.spinner(f"Loading benchmark data ({benchmark_ticker})..."):
-                benchmark_data = get_benchmark_data(start_date, end_date, benchmark_ticker)
-            
-            print(f"start date {start_date} end date {end_date}")
-            #save data
-            #filtered_df.to_csv(f"fund_data.csv", index=False)
-            #benchmark_data.to_csv("benchmark_data.csv", index=False)
+            logger.debug("period=%r start=%s end=%s", selected_period, start_date, end_date)
             
             # Create a figure with multiple traces for comparison
             fig = go.Figure()
             
             # Add fund NAV trace
-            fig.add_trace(go.Scatter(
+            fig.add_trace(line_trace(
                 x=filtered_df['date'],
                 y=filtered_df['nav'],
-                mode='lines',
                 name=f"{st.session_state.selected_fund_name}",
                 line=dict(color='#1987b8')
             ))
             
             # Add benchmark trace if data is available
-            if benchmark_data is not None and not benchmark_data.empty:
+            if aligned_period is not None:
                 # Normalize benchmark data to match fund's starting point for fair comparison
-                benchmark_data_filtered = benchmark_data[(benchmark_data['date'] >= start_date) & (benchmark_data['date'] <= end_date)]
+                period_nav = aligned_period.level('fund')
+                period_benchmark = aligned_period.level('benchmark')
                 
-                if not benchmark_data_filtered.empty:
-                    # Calculate normalized values (percentage change from first day)
-                    first_nav = filtered_df.iloc[0]['nav']
-                    first_benchmark = benchmark_data_filtered.iloc[0]['close']
-                    
-                    # Create normalized series
-                    normalized_nav = filtered_df['nav'] / first_nav * 100
-                    normalized_benchmark = benchmark_data_filtered['close'] / first_benchmark * 100
+                if len(aligned_period) > 0:
+                    # Create normalized series (percentage of the first common day)
+                    normalized_nav = period_nav / period_nav[0] * 100
+                    normalized_benchmark = period_benchmark / period_benchmark[0] * 100
                     
                     # Clear previous figure and create new comparison chart
                     fig = go.Figure()
                     
                     # Add normalized fund NAV trace
-                    fig.add_trace(go.Scatter(
-                        x=filtered_df['date'],
+                    fig.add_trace(line_trace(
+                        x=aligned_period.dates,
                         y=normalized_nav,
-                        mode='lines',
                         name=f"{st.session_state.selected_fund_name}",
                         line=dict(color='#1987b8')
                     ))
                     
                     # Add normalized benchmark trace
-                    fig.add_trace(go.Scatter(
-                        x=benchmark_data_filtered['date'],
+                    fig.add_trace(line_trace(
+                        x=aligned_period.dates,
                         y=normalized_benchmark,
-                        mode='lines',
-                        name=f"BSE 500 Index",
+                        name=benchmark_name,
                         line=dict(color='#ec9e56')
                     ))
                     
@@ -316,12 +446,12 @@ if 'selected_scheme_code' in st.session_state:
                     st.subheader("Fund vs. Benchmark Performance")
                     
                     # Calculate returns for both
-                    fund_return = ((filtered_df['nav'].iloc[-1] / filtered_df['nav'].iloc[0]) - 1) * 100
-                    benchmark_return = ((benchmark_data_filtered['close'].iloc[-1] / benchmark_data_filtered['close'].iloc[0]) - 1) * 100
+                    fund_return = ((period_nav[-1] / period_nav[0]) - 1) * 100
+                    benchmark_return = ((period_benchmark[-1] / period_benchmark[0]) - 1) * 100
                     
                     # Display comparison metrics
                     comparison_df = pd.DataFrame([
-                        {"Metric": "Total Return", "Fund": f"{fund_return:.2f}%", "BSE 500": f"{benchmark_return:.2f}%", 
+                        {"Metric": "Total Return", "Fund": f"{fund_return:.2f}%", "Benchmark": f"{benchmark_return:.2f}%", 
                          "Difference": f"{(fund_return - benchmark_return):.2f}%"}
                     ])
                     
@@ -344,13 +474,13 @@ if 'selected_scheme_code' in st.session_state:
             )
             
             # Show the comparison chart
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart("comparison", fig)
             
             # Also provide the raw NAV chart option
             show_raw_nav = st.checkbox("Show Raw NAV Values")
             if show_raw_nav:
                 raw_fig = px.line(
-                    filtered_df,
+                    chart_downsample.downsample_frame(filtered_df, 'nav'),
                     x='date',
                     y='nav',
                     title=f"NAV History for {st.session_state.selected_fund_name} ({selected_period})",
@@ -371,7 +501,7 @@ if 'selected_scheme_code' in st.session_state:
                 )
                 )
                 
-                st.plotly_chart(raw_fig, use_container_width=True)
+                show_chart("raw_nav", raw_fig)
             
                 # Show data tables with download options
                 col1, col2 = st.columns(2)
@@ -393,13 +523,10 @@ if 'selected_scheme_code' in st.session_state:
                 
                 # Show benchmark data if available
                 with col2:
-                    st.subheader("Benchmark Data (BSE 500)")
-                    
-                    # Get benchmark data covering the full fund history
-                    full_start_date = df['date'].min()
-                    full_end_date = df['date'].max()
+                    st.subheader(f"Benchmark Data ({benchmark_name})")
                     
-                    benchmark_full = get_benchmark_data(full_start_date, full_end_date, "BSE-500.BO")
+                    # Benchmark data covering the full fund history
+                    benchmark_full = fund_analytics.benchmark[['date', 'close']] if fund_analytics.has_benchmark else None
                     
                     if benchmark_full is not None and not benchmark_full.empty:
                         # Add a download button for the benchmark CSV data
@@ -407,15 +534,12 @@ if 'selected_scheme_code' in st.session_state:
                         st.download_button(
                             label="Download Benchmark Data as CSV",
                             data=benchmark_csv,
-                            file_name="BSE_500_benchmark_data.csv",
+                            file_name=f"{benchmark_key}_benchmark_data.csv",
                             mime="text/csv"
                         )
                         
                         # Filter to match the selected time period
-                        benchmark_filtered = benchmark_full[
-                            (benchmark_full['date'] >= filtered_df['date'].min()) &
-                            (benchmark_full['date'] <= filtered_df['date'].max())
-                        ]
+                        benchmark_filtered = benchmark_data
                         
                         # Show the benchmark data table
                         st.dataframe(benchmark_filtered.sort_values('date', ascending=False), use_container_width=True, height=400)
@@ -431,262 +555,124 @@ st.markdown("---")
 st.subheader("Advanced Performance Analysis")
 
 # Show the advanced analysis only if both fund and benchmark data are available
-if 'selected_scheme_code' in st.session_state and fund_details:
-    # Calculate rolling returns if we have sufficient data
-    if len(df) > 90:  # Only calculate if we have at least 3 months of data
+if 'selected_scheme_code' in st.session_state and fund_details and not fund_details['nav'].empty:
+    # Show rolling returns if we have sufficient data
+    if len(df) > 90:  # Only show if we have at least 3 months of data
         st.markdown("### Rolling Returns Analysis")
         
-        # Create tabs for different rolling return periods
-        rolling_tab1, rolling_tab2, rolling_tab3 = st.tabs(["1-Month Rolling", "3-Month Rolling", "6-Month Rolling"])
+        # Rolling returns for fund and benchmark come from the analytics snapshot,
+        # computed over calendar windows on the dates both series share
+        rolling = fund_analytics.rolling
+        rolling_summary = fund_analytics.rolling_summary
+        full_benchmark = fund_analytics.benchmark
         
-        # Calculate rolling returns for the fund
-        df['1m_rolling'] = df['nav'].pct_change(periods=30) * 100
-        df['3m_rolling'] = df['nav'].pct_change(periods=90) * 100
-        df['6m_rolling'] = df['nav'].pct_change(periods=180) * 100
+        # Only offer windows the fund history is long enough for
+        rolling_windows = [window for window in rolling.windows if window in rolling_summary.index]
         
-        # Get benchmark data for the full period
-        full_benchmark = get_benchmark_data(df['date'].min(), df['date'].max(), "BSE-500.BO")
-        
-        if full_benchmark is not None and not full_benchmark.empty:
-            # Calculate rolling returns for benchmark
-            full_benchmark['1m_rolling'] = full_benchmark['close'].pct_change(periods=30) * 100
-            full_benchmark['3m_rolling'] = full_benchmark['close'].pct_change(periods=90) * 100
-            full_benchmark['6m_rolling'] = full_benchmark['close'].pct_change(periods=180) * 100
+        if fund_analytics.has_benchmark and rolling_windows:
+            # Create tabs for different rolling return periods
+            rolling_tabs = st.tabs([f"{ROLLING_LABELS[window]} Rolling" for window in rolling_windows])
             
-            # 1-Month Rolling Returns
-            with rolling_tab1:
-                # Create a figure for 1-month rolling returns
-                roll_fig1 = go.Figure()
-                
-                # Add fund trace
-                roll_fig1.add_trace(go.Scatter(
-                    x=df['date'],
-                    y=df['1m_rolling'],
-                    mode='lines',
-                    name=f"{st.session_state.selected_fund_name}",
-                    line=dict(color='#1987b8')
-                ))
-                
-                # Add benchmark trace
-                roll_fig1.add_trace(go.Scatter(
-                    x=full_benchmark['date'],
-                    y=full_benchmark['1m_rolling'],
-                    mode='lines',
-                    name="BSE 500 Index",
-                    line=dict(color='#ec9e56')
-                ))
-                
-                roll_fig1.update_layout(
-                    title="1-Month Rolling Returns",
-                    xaxis_title="Date",
-                    yaxis_title="Return (%)",
-                    hovermode="x unified",
-                    height=400,
-                    legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                )
-                )
-                
-                st.plotly_chart(roll_fig1, use_container_width=True)
-                
-                # Calculate outperformance statistics
-                common_dates = set(df['date']).intersection(set(full_benchmark['date']))
-                if common_dates:
-                    # Create merged dataframe for comparison
-                    merged_1m = pd.merge(
-                        df[['date', '1m_rolling']],
-                        full_benchmark[['date', '1m_rolling']],
-                        on='date',
-                        suffixes=('_fund', '_benchmark')
-                    )
+            for window, rolling_tab in zip(rolling_windows, rolling_tabs):
+                with rolling_tab:
+                    annualized = rolling_returns.ROLLING_WINDOWS[window] >= rolling_returns.ANNUALIZE_FROM_MONTHS
                     
-                    # Calculate outperformance
-                    merged_1m['outperformance'] = merged_1m['1m_rolling_fund'] - merged_1m['1m_rolling_benchmark']
+                    # Create a figure for the rolling returns
+                    roll_fig = go.Figure()
                     
-                    # Calculate statistics
-                    outperf_pct = (merged_1m['outperformance'] > 0).mean() * 100
-                    avg_outperf = merged_1m['outperformance'].mean()
+                    # Add fund trace
+                    roll_fig.add_trace(line_trace(
+                        x=rolling.dates,
+                        y=rolling.fund[window],
+                        name=f"{st.session_state.selected_fund_name}",
+                        line=dict(color='#1987b8')
+                    ))
                     
+                    # Add benchmark trace
+                    roll_fig.add_trace(line_trace(
+                        x=rolling.dates,
+                        y=rolling.benchmark[window],
+                        name=benchmark_name,
+                        line=dict(color='#ec9e56')
+                    ))
+                    
+                    roll_fig.update_layout(
+                        title=f"{ROLLING_LABELS[window]} Rolling Returns" + (" (Annualized)" if annualized else ""),
+                        xaxis_title="Date",
+                        yaxis_title="Return (%)",
+                        hovermode="x unified",
+                        height=400,
+                        legend=dict(
+                        orientation="h",
+                        yanchor="bottom",
+                        y=1.02,
+                        xanchor="right",
+                        x=1
+                    )
+                    )
+                    
+                    show_chart("rolling", roll_fig)
+                    
+                    # Outperformance statistics
+                    window_summary = rolling_summary.loc[window]
                     st.metric(
-                        label="Fund Outperformance (1-Month)",
-                        value=f"{outperf_pct:.1f}% of periods",
-                        delta=f"Avg: {avg_outperf:.2f}%"
+                        label=f"Fund Outperformance ({ROLLING_LABELS[window]})",
+                        value=f"{window_summary['Beats Benchmark (%)']:.1f}% of periods",
+                        delta=f"Avg: {window_summary['Avg Outperformance']:.2f}%"
                     )
             
-            # 3-Month Rolling Returns
-            with rolling_tab2:
-                # Create a figure for 3-month rolling returns
-                roll_fig3 = go.Figure()
-                
-                # Add fund trace
-                roll_fig3.add_trace(go.Scatter(
-                    x=df['date'],
-                    y=df['3m_rolling'],
-                    mode='lines',
-                    name=f"{st.session_state.selected_fund_name}",
-                    line=dict(color='#1987b8')
-                ))
-                
-                # Add benchmark trace
-                roll_fig3.add_trace(go.Scatter(
-                    x=full_benchmark['date'],
-                    y=full_benchmark['3m_rolling'],
-                    mode='lines',
-                    name="BSE 500 Index",
-                    line=dict(color='#ec9e56')
-                ))
-                
-                roll_fig3.update_layout(
-                    title="3-Month Rolling Returns",
-                    xaxis_title="Date",
-                    yaxis_title="Return (%)",
-                    hovermode="x unified",
-                    height=400,
-                    legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                )
-                )
-                
-                st.plotly_chart(roll_fig3, use_container_width=True)
-                
-                # Calculate outperformance statistics
-                merged_3m = pd.merge(
-                    df[['date', '3m_rolling']],
-                    full_benchmark[['date', '3m_rolling']],
-                    on='date',
-                    suffixes=('_fund', '_benchmark')
-                )
-                
-                # Calculate outperformance
-                merged_3m['outperformance'] = merged_3m['3m_rolling_fund'] - merged_3m['3m_rolling_benchmark']
-                
-                # Calculate statistics
-                outperf_pct = (merged_3m['outperformance'] > 0).mean() * 100
-                avg_outperf = merged_3m['outperformance'].mean()
-                
-                st.metric(
-                    label="Fund Outperformance (3-Month)",
-                    value=f"{outperf_pct:.1f}% of periods",
-                    delta=f"Avg: {avg_outperf:.2f}%"
-                )
-            
-            # 6-Month Rolling Returns
-            with rolling_tab3:
-                # Create a figure for 6-month rolling returns
-                roll_fig6 = go.Figure()
-                
-                # Add fund trace
-                roll_fig6.add_trace(go.Scatter(
-                    x=df['date'],
-                    y=df['6m_rolling'],
-                    mode='lines',
-                    name=f"{st.session_state.selected_fund_name}",
-                    line=dict(color='#1987b8')
-                ))
-                
-                # Add benchmark trace
-                roll_fig6.add_trace(go.Scatter(
-                    x=full_benchmark['date'],
-                    y=full_benchmark['6m_rolling'],
-                    mode='lines',
-                    name="BSE 500 Index",
-                    line=dict(color='#ec9e56')
-                ))
-                
-                roll_fig6.update_layout(
-                    title="6-Month Rolling Returns",
-                    xaxis_title="Date",
-                    yaxis_title="Return (%)",
-                    hovermode="x unified",
-                    height=400,
-                    legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                )
-                )
-                
-                st.plotly_chart(roll_fig6, use_container_width=True)
-                
-                # Calculate outperformance statistics
-                merged_6m = pd.merge(
-                    df[['date', '6m_rolling']],
-                    full_benchmark[['date', '6m_rolling']],
-                    on='date',
-                    suffixes=('_fund', '_benchmark')
-                )
-                
-                # Calculate outperformance
-                merged_6m['outperformance'] = merged_6m['6m_rolling_fund'] - merged_6m['6m_rolling_benchmark']
-                
-                # Calculate statistics
-                outperf_pct = (merged_6m['outperformance'] > 0).mean() * 100
-                avg_outperf = merged_6m['outperformance'].mean()
-                
-                st.metric(
-                    label="Fund Outperformance (6-Month)",
-                    value=f"{outperf_pct:.1f}% of periods",
-                    delta=f"Avg: {avg_outperf:.2f}%"
-                )
-        
+            # Distribution of rolling returns across all windows
+            st.markdown("#### Rolling Return Distribution")
+            st.dataframe(rolling_summary.round(2), use_container_width=True)
         
-                
         # Risk Metrics Section
         st.markdown("### Risk Analysis")
         
         # Create tabs for different risk metrics
         risk_tab1, risk_tab2 = st.tabs(["Volatility Analysis", "Drawdown Analysis"])
         
-        # Get benchmark data for risk analysis if not already fetched
-        if full_benchmark is None:
-            full_benchmark = get_benchmark_data(df['date'].min(), df['date'].max(), "BSE-500.BO")
-        
-        if full_benchmark is not None and not full_benchmark.empty:
+        if fund_analytics.has_benchmark:
             # Volatility Analysis
             with risk_tab1:
-                # Calculate rolling volatility (standard deviation of returns)
-                # For monthly volatility, use daily returns and a 30-day window
-                df['daily_return'] = df['nav'].pct_change() * 100
-                df['volatility_30d'] = df['daily_return'].rolling(window=30).std() * (252 ** 0.5)  # Annualized
-                
-                full_benchmark['daily_return'] = full_benchmark['close'].pct_change() * 100
-                full_benchmark['volatility_30d'] = full_benchmark['daily_return'].rolling(window=30).std() * (252 ** 0.5)  # Annualized
+                # Rolling risk metrics of the fund and benchmark on their
+                # common dates come from the analytics snapshot, every metric
+                # and window computed in one pass
+                metric_col, window_col = st.columns(2)
+                with metric_col:
+                    risk_label = st.selectbox("Metric", list(RISK_METRICS), key="risk_metric")
+                with window_col:
+                    risk_window = st.selectbox(
+                        "Window", analytics.RISK_WINDOWS, format_func=RISK_WINDOW_LABELS.get, key="risk_window"
+                    )
+                risk_metric, risk_unit = RISK_METRICS[risk_label]
+                risk = fund_analytics.risk_series(risk_metric, risk_window)
                 
-                # Create volatility comparison chart
+                # Create risk metric chart
                 vol_fig = go.Figure()
                 
-                # Add fund volatility trace
-                vol_fig.add_trace(go.Scatter(
-                    x=df['date'],
-                    y=df['volatility_30d'],
-                    mode='lines',
+                # Add fund trace
+                vol_fig.add_trace(line_trace(
+                    x=risk['date'],
+                    y=risk['fund'],
                     name=f"{st.session_state.selected_fund_name}",
                     line=dict(color='#1987b8')
                 ))
                 
-                # Add benchmark volatility trace
-                vol_fig.add_trace(go.Scatter(
-                    x=full_benchmark['date'],
-                    y=full_benchmark['volatility_30d'],
-                    mode='lines',
-                    name="BSE 500 Index",
-                    line=dict(color='#ec9e56')
-                ))
+                # Beta and tracking error are measured against the benchmark,
+                # so it only gets a line of its own for the other metrics
+                if 'benchmark' in risk:
+                    vol_fig.add_trace(line_trace(
+                        x=risk['date'],
+                        y=risk['benchmark'],
+                        name=benchmark_name,
+                        line=dict(color='#ec9e56')
+                    ))
                 
                 vol_fig.update_layout(
-                    title="30-Day Rolling Volatility (Annualized)",
+                    title=f"{RISK_WINDOW_LABELS[risk_window]} Rolling {risk_label}"
+                    + (" (Annualized)" if risk_metric != 'beta' else ""),
                     xaxis_title="Date",
-                    yaxis_title="Volatility (%)",
+                    yaxis_title=f"{risk_label} ({risk_unit})" if risk_unit else risk_label,
                     hovermode="x unified",
                     height=400,
                     legend=dict(
@@ -698,11 +684,11 @@ if 'selected_scheme_code' in st.session_state and fund_details:
                 )
                 )
                 
-                st.plotly_chart(vol_fig, use_container_width=True)
+                show_chart("volatility", vol_fig)
                 
-                # Calculate average volatility
-                avg_fund_vol = df['volatility_30d'].mean()
-                avg_benchmark_vol = full_benchmark['volatility_30d'].mean()
+                # Average volatility
+                avg_fund_vol = fund_analytics.avg_volatility['fund']
+                avg_benchmark_vol = fund_analytics.avg_volatility['benchmark']
                 
                 col1, col2 = st.columns(2)
                 with col1:
@@ -719,32 +705,22 @@ if 'selected_scheme_code' in st.session_state and fund_details:
             
             # Drawdown Analysis
             with risk_tab2:
-                # Calculate drawdowns for fund
-                df['running_max'] = df['nav'].cummax()
-                df['drawdown'] = ((df['nav'] / df['running_max']) - 1) * 100
-                
-                # Calculate drawdowns for benchmark
-                full_benchmark['running_max'] = full_benchmark['close'].cummax()
-                full_benchmark['drawdown'] = ((full_benchmark['close'] / full_benchmark['running_max']) - 1) * 100
-                
                 # Create drawdown comparison chart
                 dd_fig = go.Figure()
                 
                 # Add fund drawdown trace
-                dd_fig.add_trace(go.Scatter(
+                dd_fig.add_trace(line_trace(
                     x=df['date'],
                     y=df['drawdown'],
-                    mode='lines',
                     name=f"{st.session_state.selected_fund_name}",
                     line=dict(color='#1987b8')
                 ))
                 
                 # Add benchmark drawdown trace
-                dd_fig.add_trace(go.Scatter(
+                dd_fig.add_trace(line_trace(
                     x=full_benchmark['date'],
                     y=full_benchmark['drawdown'],
-                    mode='lines',
-                    name="BSE 500 Index",
+                    name=benchmark_name,
                     line=dict(color='#ec9e56')
                 ))
                 
@@ -763,11 +739,11 @@ if 'selected_scheme_code' in st.session_state and fund_details:
                 )
                 )
                 
-                st.plotly_chart(dd_fig, use_container_width=True)
+                show_chart("drawdown", dd_fig)
                 
-                # Calculate maximum drawdown statistics
-                max_fund_dd = df['drawdown'].min()
-                max_benchmark_dd = full_benchmark['drawdown'].min()
+                # Maximum drawdown statistics
+                max_fund_dd = fund_analytics.max_drawdown['fund']
+                max_benchmark_dd = fund_analytics.max_drawdown['benchmark']
                 
                 # Display drawdown metrics
                 col1, col2 = st.columns(2)
@@ -783,54 +759,200 @@ if 'selected_scheme_code' in st.session_state and fund_details:
                         delta=f"{max_fund_dd - max_benchmark_dd:.2f}%"
                     )
                 
-                # Calculate additional drawdown statistics
-                # Recovery periods for significant drawdowns (>5%)
-                df['is_recovery'] = df['drawdown'] == 0
-                df['recovery_period'] = df['is_recovery'].astype(int)
-                
                 # Get current drawdown
-                current_dd = df['drawdown'].iloc[-1]
+                current_dd = fund_analytics.current_drawdown
                 
                 st.markdown("### Drawdown Statistics")
                 st.metric(
                     label="Current Drawdown",
                     value=f"{current_dd:.2f}%"
                 )
-        st.header("Quantstats Report")
-        if st.button("Download Quant Report"):
-                #print(f"start date {start_date} end date {end_date}")
-                #save data
-                #filtered_df.to_csv(f"fund_data.csv", index=False)
-                #benchmark_data.to_csv("benchmark_data.csv", index=False)
                 
+                # Worst drawdown episodes, from peak through trough to recovery
+                for label, key in ((st.session_state.selected_fund_name, 'fund'), (benchmark_name, 'benchmark')):
+                    st.markdown(f"#### Worst Drawdowns: {label}")
+                    episodes_df = fund_analytics.drawdown_episodes[key].table(top=MAX_DRAWDOWN_EPISODES)
+                    for col in ('Peak', 'Trough', 'Recovery'):
+                        episodes_df[col] = episodes_df[col].dt.strftime('%Y-%m-%d').fillna("Not recovered")
+                    st.dataframe(episodes_df.round(2), use_container_width=True, hide_index=True)
+        st.header("Quantstats Report")
+        
+        # Headline statistics for the selected period, computed directly with
+        # NumPy so they show without waiting for the full report
+        if aligned_period is not None and len(aligned_period) > 2:
+            with instrumentation.span("headline_metrics", rows=len(aligned_period)):
+                headline = quant_report.report_metrics(aligned_period)
+            headline_df = pd.DataFrame([
+                {"Metric": f"{name} ({selected_period})", "Value": HEADLINE_FORMATS[name].format(value)}
+                for name, value in headline.items()
+            ])
+            st.table(headline_df)
+        
+        # Report jobs are shared between sessions asking for the same report;
+        # this id lets one session cancel without cancelling it for the others
+        report_subscriber = st.session_state.setdefault('report_subscriber', uuid.uuid4().hex)
+        
+        if st.button("Download Quant Report") and aligned_period is not None:
+                # Rendering runs in a background worker pool; the job id is kept
+                # in the session and polled below so the page stays responsive
+                st.session_state.report_job = report_jobs.submit_report(
+                    aligned_period,
+                    fund_name=st.session_state.selected_fund_name,
+                    benchmark_name=benchmark_name,
+                    subscriber=report_subscriber
+                )
+        
+        if st.session_state.get('report_job'):
+            report_job = st.session_state.report_job
+            report_running = report_jobs.job_status(report_job, report_subscriber)['status'] in ('queued', 'running')
+            
+            # Poll the job every second while it is queued or running
+            @st.fragment(run_every=1 if report_running else None)
+            def show_report_job():
+                status = report_jobs.job_status(report_job, report_subscriber)
+                if status['status'] in ('queued', 'running'):
+                    label = "Waiting for a report worker..." if status['status'] == 'queued' else "Generating Detail Report..."
+                    st.progress(status['progress'], text=f"{label} ({status['elapsed']:.0f}s)")
+                    if st.button("Cancel Report"):
+                        report_jobs.cancel_job(report_job, report_subscriber)
+                        st.rerun()
+                elif report_running:
+                    # Finished since the last full run; rerun the page to stop polling
+                    st.rerun()
+            
+            show_report_job()
+            
+            status = report_jobs.job_status(report_job, report_subscriber)
+            if status['status'] == 'done':
+                html = report_jobs.job_result(report_job, report_subscriber)
                 st.markdown("### Report Saved ")
                 
-                curr_dir = os.path.dirname(os.path.abspath(__file__))
-                
-                # NOTE: use mkstemp will have permission issue: PermissionError: [WinError 32] The process cannot access the file because it is being used by another process
-                temp_file_name = tempfile.mktemp(suffix=f"_{st.session_state.selected_fund_name}.html", dir=os.path.join(curr_dir, "temp"))
-
                 st.header("Quantstats Report")
                 title = st.text_input("Report Title", "Strategy Tearsheet")
                 report_download = st.empty()
-                with st.spinner("Generating Detail Report..."):
-                    # TODO: customize output title, etc.
-                    create_report(fund_df=filtered_df, benchmark_df=benchmark_data, fund_name = st.session_state.selected_fund_name, benchmark_name="BSE 500 Index",temp_file_name=temp_file_name)
-                    with open(temp_file_name, "r") as fp:
-                        html = fp.read()
-                    components.html(html, scrolling=True, height=800)
+                # TODO: customize output title, etc.
+                components.html(html, scrolling=True, height=800)
                 
                 report_download.download_button(
                     "Download Report HTML",
                     html,
                     file_name= f"{st.session_state.selected_fund_name}_report.html",
                 )
+            elif status['status'] == 'failed':
+                st.error(f"Error generating report: {status['error']}")
+            elif status['status'] == 'cancelled':
+                st.info("Report generation cancelled.")
 
-                os.remove(temp_file_name)
-                
-            
-            
-                
-                
-                
-                
\ No newline at end of file
+# Multi-Fund Comparison Section
+st.markdown("---")
+st.subheader("Multi-Fund Comparison")
+
+compare_search = st.text_input("Search funds to compare:", key="compare_search_box")
+compare_matches = fund_index.search(compare_search, limit=MAX_COMPARE_OPTIONS) if compare_search else []
+
+if compare_matches and st.button(f"Add all {len(compare_matches)} matches"):
+    st.session_state.compare_funds = list(dict.fromkeys(
+        st.session_state.get('compare_funds', []) + compare_matches
+    ))[:MAX_COMPARE_FUNDS]
+
+# Keep already chosen funds selectable while the search term changes
+compare_options = list(dict.fromkeys(st.session_state.get('compare_funds', []) + compare_matches))
+compare_funds = st.multiselect(
+    "Funds to compare:",
+    compare_options,
+    key="compare_funds",
+    format_func=lambda fund: f"{fund[1]} (Code: {fund[0]})",
+    max_selections=MAX_COMPARE_FUNDS
+)
+
+if len(compare_funds) >= 2:
+    compare_names = dict(compare_funds)
+    with st.spinner(f"Loading {len(compare_funds)} funds..."):
+        compare_dates, compare_matrix, compare_codes, compare_observed, compare_errors = get_fund_comparison(
+            tuple(code for code, _ in compare_funds)
+        )
+    
+    for code, error in compare_errors.items():
+        st.warning(f"Could not load {compare_names.get(code, code)}: {error}")
+    
+    if len(compare_codes) >= 2:
+        # Growth of 100 from the first date every fund has a NAV
+        growth_dates, growth = fund_compare.normalized_growth(compare_dates, compare_matrix)
+        compare_fig = go.Figure()
+        for col, code in enumerate(compare_codes):
+            compare_fig.add_trace(line_trace(
+                x=growth_dates,
+                y=growth[:, col],
+                name=compare_names.get(code, str(code))
+            ))
+        compare_fig.update_layout(
+            title="Growth of 100 (Common Start Date)",
+            xaxis_title="Date",
+            yaxis_title="Normalized Value (Base = 100)",
+            hovermode="x unified",
+            height=500
+        )
+        show_chart("compare_funds", compare_fig)
+        
+        # Metrics computed column-wise over the aligned NAV matrix
+        with instrumentation.span("compare_metrics", funds=len(compare_codes)):
+            compare_df = fund_compare.compare_metrics(
+                compare_dates, compare_matrix, compare_codes, observed=compare_observed
+            )
+        compare_df.insert(0, 'Fund', [compare_names.get(code, str(code)) for code in compare_codes])
+        st.dataframe(compare_df.round(2), use_container_width=True)
+elif compare_funds:
+    st.info("Select at least two funds to compare.")
+
+# Fund Screener Section (served from the precomputed universe table)
+if os.path.exists(precompute_universe.OUTPUT_PATH):
+    st.markdown("---")
+    st.subheader("Fund Screener")
+    
+    universe = load_universe_metrics(os.path.getmtime(precompute_universe.OUTPUT_PATH))
+    
+    screener_col1, screener_col2 = st.columns(2)
+    with screener_col1:
+        categories = sorted(universe['scheme_category'].dropna().unique())
+        screener_category = st.selectbox("Scheme category:", ["All Categories"] + categories)
+    with screener_col2:
+        rank_by = st.selectbox("Rank by:", list(SCREENER_COLUMNS.keys()))
+    
+    screener_df = universe
+    if screener_category != "All Categories":
+        screener_df = screener_df[screener_df['scheme_category'] == screener_category]
+    
+    # Lower is better for risk columns
+    ascending = SCREENER_COLUMNS[rank_by] in ('volatility_1y',)
+    screener_df = screener_df.sort_values(SCREENER_COLUMNS[rank_by], ascending=ascending, na_position='last')
+    
+    st.caption(f"{len(screener_df)} schemes, data as of {universe['latest_date'].max().date()}")
+    st.dataframe(screener_df.head(100).round(2), use_container_width=True, hide_index=True)
+
+# End of the script run: log its summary and, in debug mode, show where the
+# time went and how the caches are doing
+instrumentation.finish_run(script_run, scheme=st.session_state.get('selected_scheme_code', ""))
+if DEBUG_PANEL:
+    with st.sidebar:
+        st.subheader("Debug: Script Run")
+        st.caption(f"{script_run.elapsed_ms:.0f} ms, {len(script_run.spans)} spans")
+        spans_df = pd.DataFrame([
+            {"Span": "\u2003" * record.depth + record.name, "Start (ms)": record.start_ms, "Duration (ms)": record.duration_ms}
+            for record in sorted(script_run.spans, key=lambda record: (record.start_ms, record.depth))
+        ])
+        st.dataframe(spans_df.round(1), use_container_width=True, hide_index=True)
+        
+        st.subheader("Debug: Caches")
+        cache_df = pd.DataFrame([
+            {"Cache": name, "Hits": hits, "Misses": misses,
+             "Hit Rate": f"{hits / (hits + misses):.0%}" if hits + misses else "N/A"}
+            for name, (hits, misses) in instrumentation.cache_stats().items()
+        ])
+        st.dataframe(cache_df, use_container_width=True, hide_index=True)
+        
+        st.download_button(
+            "Download Metrics (Prometheus)",
+            instrumentation.prometheus_text(),
+            file_name="metrics.txt",
+            mime="text/plain"
+        )
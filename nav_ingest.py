@@ -0,0 +1,93 @@
+import json
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+# orjson is optional; it decodes the multi-thousand row payloads several
+# times faster than the standard library when it is installed
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+_ZERO = ord('0')
+_DASH = ord('-') - _ZERO
+
+
+def decode_payload(raw):
+    """Decode an mfapi.in response body (bytes or str) into a dict."""
+    return _loads(raw)
+
+
+def _parse_dates(date_strings):
+    # Every date is a fixed width 'dd-mm-yyyy' string, so the whole column is
+    # decoded as one (n, 10) digit matrix instead of parsing row by row
+    n = len(date_strings)
+    try:
+        digits = np.frombuffer("".join(date_strings).encode('ascii'), dtype=np.uint8)
+        digits = digits.reshape(n, 10).astype(np.int64) - _ZERO
+    except (UnicodeEncodeError, ValueError):
+        digits = None
+    if digits is None or not ((digits[:, 2] == _DASH) & (digits[:, 5] == _DASH)).all():
+        return _parse_dates_slow(date_strings)
+
+    fields = digits[:, [0, 1, 3, 4, 6, 7, 8, 9]]
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 3] * 10 + digits[:, 4]
+    year = digits[:, 6] * 1000 + digits[:, 7] * 100 + digits[:, 8] * 10 + digits[:, 9]
+    months = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1)
+    dates = months.astype('datetime64[D]') + (day - 1)
+    # Out-of-range days would roll over into the next month (31-02 -> 02-03);
+    # let pandas reject any impossible date instead
+    valid = ((fields >= 0) & (fields <= 9)).all() and ((month >= 1) & (month <= 12) & (day >= 1)).all()
+    if not valid or (dates.astype('datetime64[M]') != months).any():
+        return _parse_dates_slow(date_strings)
+    return dates
+
+
+def _parse_dates_slow(date_strings):
+    return pd.to_datetime(pd.Series(date_strings), format='%d-%m-%Y').to_numpy().astype('datetime64[D]')
+
+
+def _parse_navs(nav_strings):
+    try:
+        return np.array(nav_strings, dtype=np.float64)
+    except ValueError:
+        # Occasional non-numeric entries (e.g. 'N.A.') become NaN and are dropped
+        return pd.to_numeric(pd.Series(nav_strings), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def parse_nav_records(records):
+    """Turn mfapi.in 'data' records into sorted (datetime64[D], float64) arrays."""
+    if not records:
+        return np.empty(0, dtype='datetime64[D]'), np.empty(0, dtype=np.float64)
+
+    date_strings, nav_strings = zip(*map(itemgetter('date', 'nav'), records))
+    dates = _parse_dates(date_strings)
+    navs = _parse_navs(nav_strings)
+
+    # mfapi.in lists newest first, so a reversal is normally all that's needed
+    if len(dates) > 1 and (dates[1:] < dates[:-1]).all():
+        dates, navs = dates[::-1], navs[::-1]
+    elif len(dates) > 1 and not (dates[1:] >= dates[:-1]).all():
+        order = np.argsort(dates, kind='stable')
+        dates, navs = dates[order], navs[order]
+
+    keep = ~np.isnan(navs)
+    keep[1:] &= dates[1:] != dates[:-1]
+    return np.ascontiguousarray(dates[keep]), np.ascontiguousarray(navs[keep])
+
+
+def nav_frame(dates, navs):
+    """Date-indexed NAV frame from already sorted arrays."""
+    index = pd.DatetimeIndex(np.asarray(dates).astype('datetime64[ns]'), name='date')
+    return pd.DataFrame({'nav': np.asarray(navs, dtype=np.float64)}, index=index)
+
+
+def parse_payload(raw):
+    """Decode a raw mfapi.in scheme response into (meta, date-indexed frame)."""
+    payload = decode_payload(raw)
+    dates, navs = parse_nav_records(payload.get('data') or [])
+    return payload.get('meta', {}), nav_frame(dates, navs)
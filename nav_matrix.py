@@ -0,0 +1,259 @@
+"""Memory-mapped NAV matrix of the whole fund universe.
+
+    python nav_matrix.py                   # build from the local store
+    python nav_matrix.py --dtype float64
+
+Every stored scheme is one column of a (dates x schemes) matrix on a
+shared business-day axis, written as .npy files in column-major order so
+a scheme's history is one contiguous slice of the file. Readers open it
+with np.load(mmap_mode='r'): opening costs a few small reads, a fund's
+slice is a view into the mapping, and every process on the host shares
+the operating system's page cache rather than holding its own copy.
+
+Each build goes into its own version directory and CURRENT is switched to
+it afterwards, so readers never see a half-written matrix and a process
+that still maps the previous version keeps working.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+
+import instrumentation
+import nav_store
+
+MATRIX_DIR = os.path.join(os.path.dirname(nav_store.STORE_PATH), "nav_matrix")
+# float32 keeps ~7 significant digits, ample for NAVs, at half the size
+DEFAULT_DTYPE = "float32"
+# Schemes read from the store per query while building
+CHUNK_SIZE = 500
+# How often get_matrix() looks for a newer build
+CHECK_SECONDS = 60
+# Builds kept besides the current one, for processes still mapping them
+KEEP_PREVIOUS = 1
+
+logger = logging.getLogger("nav_matrix")
+
+_matrix = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class NavMatrix:
+    """NAVs of many schemes on one date axis.
+
+    `navs` is (dates x schemes), NaN before a scheme's first NAV and after
+    its last one and forward-filled in between; `observed` marks the rows
+    holding a NAV of the scheme's own. `first` / `last` are the row range
+    of each column and `codes` is sorted, so the column of a scheme code
+    is a binary search.
+    """
+    version: str
+    dates: np.ndarray
+    codes: np.ndarray
+    first: np.ndarray
+    last: np.ndarray
+    navs: np.ndarray
+    observed: np.ndarray
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, scheme_code):
+        return self.column(scheme_code) is not None
+
+    def column(self, scheme_code):
+        """Column index of a scheme code, or None if it is not in the matrix."""
+        col = int(np.searchsorted(self.codes, int(scheme_code)))
+        if col < len(self.codes) and self.codes[col] == int(scheme_code):
+            return col
+        return None
+
+    def series(self, scheme_code, since=None, observed_only=False):
+        """(dates, navs) of one scheme over its own date range (from `since`
+        on when given), as views into the mapped file; None if the scheme
+        is not in the matrix. With `observed_only`, forward-filled rows are
+        left out and the arrays are copies."""
+        col = self.column(scheme_code)
+        if col is None:
+            return None
+        lo, hi = int(self.first[col]), int(self.last[col]) + 1
+        if since is not None:
+            lo = max(lo, int(np.searchsorted(self.dates, np.datetime64(since, 'D'), side='left')))
+        dates, navs = self.dates[lo:hi], self.navs[lo:hi, col]
+        if observed_only:
+            own = self.observed[lo:hi, col]
+            return dates[own], navs[own]
+        return dates, navs
+
+    def select(self, scheme_codes, since=None, observed_only=False):
+        """{scheme_code: (dates, navs)} for the codes present in the matrix."""
+        selected = {}
+        for code in scheme_codes:
+            series = self.series(code, since, observed_only)
+            if series is not None and len(series[0]):
+                selected[int(code)] = series
+        return selected
+
+
+def _current_version(path):
+    try:
+        with open(os.path.join(path, "CURRENT"), encoding="utf-8") as fp:
+            return fp.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def open_matrix(path=MATRIX_DIR):
+    """Map the current build at `path`, or return None if none was built."""
+    version = _current_version(path)
+    if version is None:
+        return None
+    build_dir = os.path.join(path, version)
+    with instrumentation.span("nav_matrix.open"):
+        load = lambda name, mode=None: np.load(os.path.join(build_dir, f"{name}.npy"), mmap_mode=mode)
+        return NavMatrix(
+            version=version,
+            dates=load("dates"),
+            codes=load("codes"),
+            first=load("first"),
+            last=load("last"),
+            navs=load("navs", "r"),
+            observed=load("observed", "r"),
+        )
+
+
+def get_matrix(path=MATRIX_DIR):
+    """Process-wide matrix, switching to a newer build when one appears.
+
+    Returns None until a matrix has been built.
+    """
+    global _matrix, _checked_at
+    now = time.monotonic()
+    if _matrix is not None and now - _checked_at < CHECK_SECONDS:
+        return _matrix
+    with _lock:
+        if _matrix is None or now - _checked_at >= CHECK_SECONDS:
+            version = _current_version(path)
+            if version is None:
+                _matrix = None
+            elif _matrix is None or _matrix.version != version:
+                _matrix = open_matrix(path)
+            _checked_at = now
+    return _matrix
+
+
+def business_days(days):
+    """NAV dates moved to a business day; a NAV published on a weekend
+    counts from the following Monday."""
+    return np.busday_offset(np.asarray(days).astype('datetime64[D]'), 0, roll='forward')
+
+
+def write(chunks, codes, dates, path=MATRIX_DIR, dtype=DEFAULT_DTYPE):
+    """Write a new build for `codes` (sorted) on the `dates` axis, filled
+    from an iterable of {scheme_code: (dates, navs)} chunks, and make it
+    current. Returns the build's version."""
+    codes = np.asarray(codes, dtype=np.int64)
+    dates = np.asarray(dates).astype('datetime64[D]')
+    version = f"{time.time_ns():020d}"
+    build_dir = os.path.join(path, version)
+    os.makedirs(build_dir)
+
+    navs = np.lib.format.open_memmap(
+        os.path.join(build_dir, "navs.npy"), mode="w+", dtype=dtype,
+        shape=(len(dates), len(codes)), fortran_order=True
+    )
+    navs[:] = np.nan
+    # One byte per cell: which rows hold a NAV rather than a filled one
+    observed = np.lib.format.open_memmap(
+        os.path.join(build_dir, "observed.npy"), mode="w+", dtype=bool,
+        shape=(len(dates), len(codes)), fortran_order=True
+    )
+    first = np.zeros(len(codes), dtype=np.int64)
+    last = np.full(len(codes), -1, dtype=np.int64)
+    for chunk in chunks:
+        for code, (own_dates, values) in chunk.items():
+            col = int(np.searchsorted(codes, code))
+            if len(own_dates) == 0 or col == len(codes) or codes[col] != code:
+                continue
+            rows = np.searchsorted(dates, business_days(own_dates))
+            # Forward-fill each row from the latest NAV at or before it; of
+            # several NAVs mapped to one row the last one wins
+            source = np.searchsorted(rows, np.arange(rows[0], rows[-1] + 1), side='right') - 1
+            navs[rows[0]:rows[-1] + 1, col] = np.asarray(values)[source]
+            observed[rows, col] = True
+            first[col], last[col] = rows[0], rows[-1]
+    navs.flush()
+    observed.flush()
+    del navs, observed
+
+    np.save(os.path.join(build_dir, "dates.npy"), dates)
+    np.save(os.path.join(build_dir, "codes.npy"), codes)
+    np.save(os.path.join(build_dir, "first.npy"), first)
+    np.save(os.path.join(build_dir, "last.npy"), last)
+    with open(os.path.join(build_dir, "meta.json"), "w", encoding="utf-8") as fp:
+        json.dump({
+            'built_at': datetime.now(timezone.utc).isoformat(),
+            'dtype': dtype,
+            'schemes': len(codes),
+            'dates': len(dates),
+        }, fp)
+
+    # Switch CURRENT with a rename so readers see the old or the new build
+    tmp_path = os.path.join(path, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        fp.write(version)
+    os.replace(tmp_path, os.path.join(path, "CURRENT"))
+    _prune(path, version)
+    return version
+
+
+def _prune(path, current):
+    builds = sorted(name for name in os.listdir(path) if name.isdigit() and name != current)
+    for name in builds[:max(len(builds) - KEEP_PREVIOUS, 0)]:
+        # Processes still mapping a removed build keep reading it until they reopen
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+
+def build(path=MATRIX_DIR, dtype=DEFAULT_DTYPE, chunk_size=CHUNK_SIZE, conn=None):
+    """Build the matrix from every scheme in the local store."""
+    own = conn is None
+    conn = conn or nav_store.connect()
+    try:
+        codes = np.array(sorted(nav_store.stored_codes(conn=conn)), dtype=np.int64)
+        dates = np.unique(business_days(nav_store.stored_days(conn=conn)))
+        logger.info("Building a %d x %d %s matrix", len(dates), len(codes), dtype)
+        chunks = (
+            nav_store.load_histories(codes[i:i + chunk_size].tolist(), conn=conn)
+            for i in range(0, len(codes), chunk_size)
+        )
+        os.makedirs(path, exist_ok=True)
+        version = write(chunks, codes, dates, path=path, dtype=dtype)
+    finally:
+        if own:
+            conn.close()
+    logger.info("Wrote build %s to %s", version, path)
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dtype", default=DEFAULT_DTYPE, choices=("float32", "float64"))
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="schemes read from the store per query")
+    parser.add_argument("--output", default=MATRIX_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    build(path=args.output, dtype=args.dtype, chunk_size=args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
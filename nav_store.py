@@ -0,0 +1,245 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import requests
+
+import instrumentation
+import mfapi_client
+from nav_ingest import decode_payload, parse_nav_records
+
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "nav_store.sqlite")
+
+# Schemes synced more recently than this are served straight from disk
+SYNC_INTERVAL = timedelta(minutes=30)
+
+# NAV dates are stored as integer days since the unix epoch so a whole
+# history can be read back as a datetime64[D] array without string parsing
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS schemes (
+    scheme_code INTEGER PRIMARY KEY,
+    meta TEXT NOT NULL,
+    last_day INTEGER,
+    synced_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nav (
+    scheme_code INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    nav REAL NOT NULL,
+    PRIMARY KEY (scheme_code, day)
+) WITHOUT ROWID;
+-- Peer ranking looks schemes up by category
+CREATE INDEX IF NOT EXISTS schemes_category ON schemes (json_extract(meta, '$.scheme_category'));
+"""
+
+
+def connect(path=STORE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    # WAL lets readers in other sessions/processes run while a sync writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _fetch_payload(scheme_code, start_day=None):
+    params = None
+    if start_day is not None:
+        # Ask only for the tail; rows we already have are filtered out below
+        # in case the API ignores the date filter and returns everything
+        start = np.datetime64(int(start_day), 'D').astype(str)
+        params = {"startDate": start}
+    response = mfapi_client.get(str(scheme_code), params=params)
+    return decode_payload(response.content)
+
+
+def last_synced(scheme_code, conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        row = conn.execute(
+            "SELECT synced_at FROM schemes WHERE scheme_code = ?", (int(scheme_code),)
+        ).fetchone()
+    finally:
+        if own:
+            conn.close()
+    return datetime.fromisoformat(row[0]) if row else None
+
+
+def sync_scheme(scheme_code, conn=None, force=False):
+    """Bring the stored history for a scheme up to date; returns rows added."""
+    scheme_code = int(scheme_code)
+    own = conn is None
+    conn = conn or connect()
+    try:
+        row = conn.execute(
+            "SELECT last_day, synced_at FROM schemes WHERE scheme_code = ?", (scheme_code,)
+        ).fetchone()
+        last_day = row[0] if row else None
+        fresh = row and not force and _utcnow() - datetime.fromisoformat(row[1]) < SYNC_INTERVAL
+        instrumentation.count_cache("nav_store.fresh", hit=bool(fresh))
+        if fresh:
+            return 0
+
+        payload = _fetch_payload(scheme_code, last_day)
+        with instrumentation.span("nav_ingest.parse", scheme=scheme_code):
+            dates, navs = parse_nav_records(payload.get('data') or [])
+        days = dates.astype(np.int64)
+        if last_day is not None:
+            keep = days > last_day
+            days, navs = days[keep], navs[keep]
+
+        new_last = int(days.max()) if len(days) else last_day
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO nav (scheme_code, day, nav) VALUES (?, ?, ?)",
+                zip([scheme_code] * len(days), days.tolist(), navs.tolist()),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO schemes (scheme_code, meta, last_day, synced_at) VALUES (?, ?, ?, ?)",
+                (scheme_code, json.dumps(payload.get('meta', {})), new_last, _utcnow().isoformat()),
+            )
+        return len(days)
+    finally:
+        if own:
+            conn.close()
+
+
+def load_meta(scheme_code, conn=None):
+    """A stored scheme's metadata without its history, or None."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        row = conn.execute(
+            "SELECT meta FROM schemes WHERE scheme_code = ?", (int(scheme_code),)
+        ).fetchone()
+    finally:
+        if own:
+            conn.close()
+    return json.loads(row[0]) if row else None
+
+
+def load_scheme(scheme_code, conn=None):
+    """Read a stored scheme as {'meta', 'dates', 'navs'} sorted by date, or None."""
+    scheme_code = int(scheme_code)
+    own = conn is None
+    conn = conn or connect()
+    try:
+        row = conn.execute(
+            "SELECT meta FROM schemes WHERE scheme_code = ?", (scheme_code,)
+        ).fetchone()
+        if row is None:
+            return None
+        with instrumentation.span("nav_store.load", scheme=scheme_code):
+            rows = conn.execute(
+                "SELECT day, nav FROM nav WHERE scheme_code = ? ORDER BY day", (scheme_code,)
+            ).fetchall()
+    finally:
+        if own:
+            conn.close()
+
+    table = np.array(rows, dtype=np.float64).reshape(-1, 2)
+    return {
+        'meta': json.loads(row[0]),
+        'dates': table[:, 0].astype(np.int64).astype('datetime64[D]'),
+        'navs': np.ascontiguousarray(table[:, 1]),
+    }
+
+
+def category_codes(scheme_category, conn=None):
+    """Scheme codes of every stored scheme in a category, and a version
+    (scheme count, latest NAV day, sum of every scheme's latest NAV day)
+    that changes when their data does: syncs only append newer days, so
+    any member catching up moves the sum even when the latest day stays."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute(
+            "SELECT scheme_code, last_day FROM schemes WHERE json_extract(meta, '$.scheme_category') = ? "
+            "AND last_day IS NOT NULL ORDER BY scheme_code",
+            (scheme_category,),
+        ).fetchall()
+    finally:
+        if own:
+            conn.close()
+    codes = [code for code, _ in rows]
+    days = [day for _, day in rows]
+    return codes, (len(rows), max(days, default=None), sum(days))
+
+
+def stored_codes(conn=None):
+    """Codes of every scheme with stored NAVs."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute("SELECT scheme_code FROM schemes WHERE last_day IS NOT NULL").fetchall()
+    finally:
+        if own:
+            conn.close()
+    return [code for code, in rows]
+
+
+def stored_days(conn=None):
+    """Every date on which some stored scheme has a NAV, sorted."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute("SELECT DISTINCT day FROM nav ORDER BY day").fetchall()
+    finally:
+        if own:
+            conn.close()
+    return np.array([day for day, in rows], dtype=np.int64).astype('datetime64[D]')
+
+
+def load_histories(scheme_codes, since=None, conn=None):
+    """Stored NAVs of several schemes as {scheme_code: (dates, navs)}, read
+    in one query and only from `since` (a date) on when given; schemes
+    without stored NAVs are left out."""
+    codes = sorted({int(code) for code in scheme_codes})
+    first_day = -(1 << 62) if since is None else int(np.asarray(since).astype('datetime64[D]').astype(np.int64))
+    own = conn is None
+    conn = conn or connect()
+    try:
+        with instrumentation.span("nav_store.load_histories", schemes=len(codes)):
+            # Codes are passed as one JSON array, so any number fits in a single query
+            rows = conn.execute(
+                "SELECT scheme_code, day, nav FROM nav "
+                "WHERE scheme_code IN (SELECT value FROM json_each(?)) AND day >= ? ORDER BY scheme_code, day",
+                (json.dumps(codes), first_day),
+            ).fetchall()
+    finally:
+        if own:
+            conn.close()
+
+    table = np.array(rows, dtype=np.float64).reshape(-1, 3)
+    scheme_col = table[:, 0].astype(np.int64)
+    days = table[:, 1].astype(np.int64).astype('datetime64[D]')
+    navs = table[:, 2]
+    # Rows are grouped by scheme; split at every change of scheme code
+    starts = np.flatnonzero(np.diff(scheme_col, prepend=-1))
+    ends = np.append(starts[1:], len(table))
+    return {
+        int(scheme_col[lo]): (days[lo:hi], np.ascontiguousarray(navs[lo:hi]))
+        for lo, hi in zip(starts, ends)
+    }
+
+
+def get_scheme(scheme_code, force=False):
+    # Sync when stale, then serve from disk; a failed sync falls back to
+    # whatever history is already stored and only raises on a cold miss
+    conn = connect()
+    try:
+        try:
+            sync_scheme(scheme_code, conn=conn, force=force)
+        except (requests.RequestException, ValueError):
+            if last_synced(scheme_code, conn=conn) is None:
+                raise
+        return load_scheme(scheme_code, conn=conn)
+    finally:
+        conn.close()
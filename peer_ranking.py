@@ -0,0 +1,204 @@
+"""Percentile ranking of a fund against every stored scheme in its category.
+
+The category's NAV histories are aligned once into a date x scheme matrix
+and every metric is computed column-wise over it, so ranking is one sort
+per metric across the category rather than a loop over funds.
+Percentiles run from 0 (worst in the category) to 100 (best).
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import fund_compare
+import instrumentation
+import nav_matrix
+import nav_store
+import period_returns
+import rolling_returns
+
+RETURN_HORIZONS = ('1M', '3M', '6M', '1Y', '3Y', '5Y')
+# Risk is measured over the same trailing window for every peer, so a
+# young fund is not flattered by missing the drawdowns before its launch
+RISK_DAYS = 1095
+# Consistency: how often the fund's 1-year rolling return beat the
+# category median over the last three years of rolling windows
+CONSISTENCY_MONTHS = 12
+CONSISTENCY_DAYS = 1095
+# Schemes whose latest NAV is older than this (closed or merged) are not peers
+STALE_DAYS = 30
+TRADING_DAYS = 252
+# History read per scheme: enough for the longest return horizon, which
+# also covers the risk and consistency windows
+HISTORY_DAYS = max(
+    period_returns.HORIZON_DAYS[RETURN_HORIZONS[-1]], RISK_DAYS, CONSISTENCY_DAYS + 31 * CONSISTENCY_MONTHS
+) + 7
+
+_DAY = np.timedelta64(1, 'D')
+
+# (column, label, higher is better)
+METRICS = tuple(
+    (f"return_{h.lower()}", f"{h} Return (%)", True) for h in RETURN_HORIZONS
+) + (
+    ('rolling_1y_above_median', "1Y Rolling Return Above Category Median (% of periods)", True),
+    ('volatility_3y', "Volatility, 3 Years (%)", False),
+    ('max_drawdown_3y', "Max Drawdown, 3 Years (%)", True),
+)
+
+
+def percentile_ranks(values, higher_is_better=True):
+    """(percentile, rank) of every value among the non-NaN ones.
+
+    The best value gets percentile 100 and rank 1; tied values share the
+    average percentile and the best rank. NaN stays NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    percentile = np.full(values.shape, np.nan)
+    rank = np.full(values.shape, np.nan)
+    ok = ~np.isnan(values)
+    scores = values[ok] if higher_is_better else -values[ok]
+    if len(scores) == 0:
+        return percentile, rank
+    peers = np.sort(scores)
+    below = np.searchsorted(peers, scores, side='left')
+    not_above = np.searchsorted(peers, scores, side='right')
+    rank[ok] = len(peers) - not_above + 1
+    if len(peers) > 1:
+        percentile[ok] = (below + (not_above - below - 1) / 2) / (len(peers) - 1) * 100
+    return percentile, rank
+
+
+def peer_metrics(dates, matrix, observed):
+    """{column: per-scheme values} over an aligned (dates x schemes) NAV
+    matrix whose schemes are all current; `observed` is as for
+    fund_compare.compare_metrics."""
+    dates = np.asarray(dates).astype('datetime64[D]')
+    n = len(dates)
+    returns = period_returns.batch_trailing_returns(dates, matrix, RETURN_HORIZONS, strict=True)
+    metrics = {f"return_{h.lower()}": returns[i] for i, h in enumerate(RETURN_HORIZONS)}
+
+    # Schemes without a NAV at the start of a window have too short a history for it
+    lo = int(np.searchsorted(dates, dates[-1] - RISK_DAYS * _DAY, side='left'))
+    window = matrix[lo:]
+    full = ~np.isnan(window[0]) & (dates[0] < dates[lo])
+    daily = fund_compare.daily_returns(window, observed[lo:])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volatility = np.nanstd(daily, axis=0, ddof=1) * np.sqrt(TRADING_DAYS) * 100
+        max_drawdown = np.nanmin(window / np.fmax.accumulate(window, axis=0) - 1, axis=0) * 100
+    metrics['volatility_3y'] = np.where(full, volatility, np.nan)
+    metrics['max_drawdown_3y'] = np.where(full, max_drawdown, np.nan)
+
+    anchors = rolling_returns.window_anchors(dates, CONSISTENCY_MONTHS)
+    rows = np.arange(int(np.searchsorted(dates, dates[-1] - CONSISTENCY_DAYS * _DAY, side='left')), n)
+    rows = rows[anchors[rows] >= 0]
+    above = np.full(matrix.shape[1], np.nan)
+    if len(rows):
+        rolling = matrix[rows] / matrix[anchors[rows]] - 1
+        has_value = ~np.isnan(rolling)
+        # Only rows where at least one scheme has a rolling return have a median
+        median = np.nanmedian(np.where(has_value.any(axis=1, keepdims=True), rolling, 0.0), axis=1, keepdims=True)
+        beats = (rolling > median).sum(axis=0)
+        above = np.where(has_value[0], beats / has_value.sum(axis=0) * 100, np.nan)
+    metrics['rolling_1y_above_median'] = above
+    return metrics
+
+
+@dataclass(frozen=True)
+class PeerGroup:
+    """Metrics, percentiles and ranks of every current scheme in a category,
+    each a DataFrame indexed by scheme code with one column per metric."""
+    category: str
+    as_of: np.datetime64
+    metrics: pd.DataFrame
+    percentiles: pd.DataFrame
+    ranks: pd.DataFrame
+
+    def __len__(self):
+        return len(self.metrics)
+
+    def __contains__(self, scheme_code):
+        return int(scheme_code) in self.metrics.index
+
+    def fund_table(self, scheme_code):
+        """One row per metric: the fund's value, the category median, its
+        rank among the schemes with a value, and its percentile."""
+        scheme_code = int(scheme_code)
+        counts = self.metrics.notna().sum()
+        medians = self.metrics.median()
+        rows = []
+        for column, label, _ in METRICS:
+            value = self.metrics.at[scheme_code, column]
+            rank = self.ranks.at[scheme_code, column]
+            rows.append({
+                'Metric': label,
+                'Fund': value,
+                'Category Median': medians[column],
+                'Rank': f"{rank:.0f} of {counts[column]}" if not np.isnan(rank) else "N/A",
+                'Percentile': self.percentiles.at[scheme_code, column],
+            })
+        return pd.DataFrame(rows)
+
+
+def build_peer_group(category, series):
+    """Rank every scheme in {scheme_code: (dates, navs)} against the others."""
+    with instrumentation.span("peer_ranking.build", schemes=len(series)):
+        series = {code: s for code, s in series.items() if len(s[0])}
+        latest = max((np.asarray(s[0][-1]).astype('datetime64[D]') for s in series.values()), default=None)
+        current = {
+            code: s for code, s in series.items()
+            if latest - np.asarray(s[0][-1]).astype('datetime64[D]') <= STALE_DAYS * _DAY
+        }
+        codes = list(current)
+        metrics, percentiles, ranks = {}, {}, {}
+        if codes:
+            dates, matrix, codes = fund_compare.build_nav_matrix(current)
+            values = peer_metrics(dates, matrix, fund_compare.observed_mask(dates, current, codes))
+            for column, _, higher_is_better in METRICS:
+                metrics[column] = values[column]
+                percentiles[column], ranks[column] = percentile_ranks(values[column], higher_is_better)
+        columns = [column for column, _, _ in METRICS]
+        index = pd.Index(codes, name='scheme_code')
+        return PeerGroup(
+            category=category,
+            as_of=latest,
+            metrics=pd.DataFrame(metrics, index=index, columns=columns),
+            percentiles=pd.DataFrame(percentiles, index=index, columns=columns),
+            ranks=pd.DataFrame(ranks, index=index, columns=columns),
+        )
+
+
+def group_version(category, conn=None):
+    """Changes whenever load_peer_group(category) would give a different result."""
+    matrix = nav_matrix.get_matrix()
+    _, version = nav_store.category_codes(category, conn=conn)
+    return version, matrix.version if matrix is not None else None
+
+
+def load_peer_group(category, conn=None):
+    """Peer group of every scheme in the local store with this category.
+
+    Histories come from the memory-mapped NAV matrix where one is built,
+    with NAVs added since the build and schemes missing from it read from
+    the store; without a matrix everything is read from the store.
+    """
+    codes, (_, last_day, _) = nav_store.category_codes(category, conn=conn)
+    if last_day is None:
+        return build_peer_group(category, {})
+    since = np.datetime64(int(last_day), 'D') - HISTORY_DAYS * _DAY
+    matrix = nav_matrix.get_matrix()
+    if matrix is None:
+        return build_peer_group(category, nav_store.load_histories(codes, since=since, conn=conn))
+
+    series = matrix.select(codes, since=since, observed_only=True)
+    missing = [code for code in codes if code not in series]
+    # Each scheme continues from its own last NAV in the matrix, which for a
+    # late-publishing fund can be well before the matrix's last date
+    own_last = {code: dates[-1] for code, (dates, _) in series.items()}
+    newer = nav_store.load_histories(list(own_last), since=min(own_last.values()) + _DAY, conn=conn) if own_last else {}
+    for code, (dates, navs) in newer.items():
+        keep = dates > own_last[code]
+        if keep.any():
+            old_dates, old_navs = series[code]
+            series[code] = (np.concatenate([old_dates, dates[keep]]), np.concatenate([old_navs, navs[keep]]))
+    series.update(nav_store.load_histories(missing, since=since, conn=conn))
+    return build_peer_group(category, series)
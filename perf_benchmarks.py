@@ -0,0 +1,285 @@
+"""Offline performance benchmarks for the analysis hot paths.
+
+    python perf_benchmarks.py --output perf.json
+    python perf_benchmarks.py --compare perf.json   # fail on regressions
+
+Times NAV ingestion, period and rolling returns, volatility, drawdowns,
+fund/benchmark alignment, tear-sheet metrics, the quantstats report,
+fund-name search and the memory-mapped NAV matrix on the bundled CSV
+fixtures and on seeded synthetic data: a 30-year fund/benchmark pair and a
+1,000-fund universe. No network access is needed and the synthetic data is
+identical from run to run.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import aligned_returns
+import analytics
+import chart_downsample
+import drawdown_episodes
+import fund_compare
+import incremental_analytics
+import nav_ingest
+import nav_matrix
+import period_returns
+import quant_report
+import rolling_returns
+import rolling_risk
+import tearsheet_metrics
+from fund_search import FundSearchIndex
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = {
+    'fixture': ("fund_data.csv", "benchmark_data.csv"),
+    'fixture_test': ("test_fund_data.csv", "test_benchmark_df.csv"),
+}
+SEED = 20240101
+SYNTHETIC_YEARS = 30
+UNIVERSE_FUNDS = 1000
+SEARCH_NAMES = 40000
+SEARCH_QUERIES = ("quant small", "hdfc mid cap direct", "nifty 50 index", "flexi", "liquid growth", "axis blue")
+# A case counts as a regression when its median is this much slower than the baseline
+DEFAULT_TOLERANCE = 0.25
+
+_HOUSES = ("Aditya Birla", "Axis", "Bandhan", "Canara Robeco", "DSP", "Edelweiss", "Franklin", "HDFC", "HSBC",
+           "ICICI Prudential", "Invesco", "Kotak", "LIC", "Mirae Asset", "Motilal Oswal", "Nippon India", "PGIM",
+           "Parag Parikh", "quant", "SBI", "Sundaram", "Tata", "UTI", "WhiteOak", "Bajaj Finserv", "Quantum")
+_STYLES = ("Small Cap", "Mid Cap", "Large Cap", "Flexi Cap", "Multi Cap", "Large & Mid Cap", "ELSS Tax Saver",
+           "Nifty 50 Index", "Nifty Next 50 Index", "Liquid", "Overnight", "Gilt", "Banking & PSU Debt",
+           "Corporate Bond", "Balanced Advantage", "Arbitrage", "Focused", "Value", "Dividend Yield", "Bluechip")
+_PLANS = ("Direct Plan", "Regular Plan")
+_OPTIONS = ("Growth", "IDCW", "IDCW Reinvestment", "Bonus")
+
+
+def load_fixture(fund_csv, benchmark_csv):
+    fund = pd.read_csv(os.path.join(BASE_DIR, fund_csv), usecols=['date', 'nav'], parse_dates=['date'])
+    benchmark = pd.read_csv(os.path.join(BASE_DIR, benchmark_csv), usecols=['date', 'close'], parse_dates=['date'])
+    return (
+        (fund['date'].to_numpy().astype('datetime64[D]'), fund['nav'].to_numpy(dtype=np.float64)),
+        (benchmark['date'].to_numpy().astype('datetime64[D]'), benchmark['close'].to_numpy(dtype=np.float64)),
+    )
+
+
+def _business_days(years, end=np.datetime64('2025-03-14')):
+    start = end - np.timedelta64(int(years * 365.25), 'D')
+    days = np.arange(start, end + np.timedelta64(1, 'D'), dtype='datetime64[D]')
+    return days[np.is_busday(days)]
+
+
+def synthetic_pair(years=SYNTHETIC_YEARS, seed=SEED):
+    """Correlated fund and benchmark price paths over `years` of business days."""
+    rng = np.random.default_rng(seed)
+    days = _business_days(years)
+    market = rng.normal(0.0004, 0.011, len(days))
+    fund = 0.9 * market + rng.normal(0.0001, 0.006, len(days))
+    return (days, 10 * np.cumprod(1 + fund)), (days, 1000 * np.cumprod(1 + market))
+
+
+def synthetic_universe(n_funds=UNIVERSE_FUNDS, years=SYNTHETIC_YEARS, seed=SEED):
+    """{code: (dates, navs)} for funds launched at random points in the window."""
+    rng = np.random.default_rng(seed + 1)
+    days = _business_days(years)
+    market = rng.normal(0.0004, 0.011, len(days))
+    starts = rng.integers(0, len(days) - 260, n_funds)
+    universe = {}
+    for code, start in enumerate(starts, start=100000):
+        beta = rng.uniform(0.3, 1.2)
+        returns = beta * market[start:] + rng.normal(0.0001, 0.005, len(days) - start)
+        universe[code] = (days[start:], 10 * np.cumprod(1 + returns))
+    return universe
+
+
+def synthetic_names(n=SEARCH_NAMES, seed=SEED):
+    rng = np.random.default_rng(seed + 2)
+    parts = [rng.choice(options, n) for options in (_HOUSES, _STYLES, _PLANS, _OPTIONS)]
+    return [f"{h} {s} Fund - {p} - {o}" + (f" Series {i}" if i % 3 == 0 else "")
+            for i, (h, s, p, o) in enumerate(zip(*parts))]
+
+
+def mfapi_payload(dates, navs):
+    """Raw mfapi.in response body for a series, newest first like the API."""
+    date_strings = pd.DatetimeIndex(dates[::-1].astype('datetime64[ns]')).strftime('%d-%m-%Y')
+    data = [{'date': d, 'nav': f"{v:.5f}"} for d, v in zip(date_strings, navs[::-1])]
+    return json.dumps({'meta': {'scheme_code': 0}, 'data': data, 'status': 'SUCCESS'}).encode()
+
+
+def timed(fn, repeat):
+    """Run `fn` once to warm up, then `repeat` times; timings in milliseconds."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'min_ms': min(samples), 'median_ms': statistics.median(samples), 'repeat': repeat}
+
+
+def pair_cases(fund, benchmark):
+    """(case, rows, fn) for one fund/benchmark pair."""
+    (dates, navs), (bdates, bcloses) = fund, benchmark
+    payload = mfapi_payload(dates, navs)
+    nav_frame = nav_ingest.nav_frame(dates, navs)
+    history = pd.DataFrame({'date': bdates.astype('datetime64[ns]'), 'close': bcloses})
+    aligned = aligned_returns.align({'fund': fund, 'benchmark': benchmark})
+    window = aligned.trailing(365)
+    running_benchmark = incremental_analytics.benchmark_series('benchmark', bdates, bcloses)
+    state = incremental_analytics.update(None, dates[:-1], navs[:-1], running_benchmark)
+    window_returns = navs[1:] / navs[:-1] - 1
+    n = len(dates)
+    return [
+        ('ingest_payload', n, lambda: nav_ingest.parse_payload(payload)),
+        ('period_returns', n, lambda: period_returns.trailing_returns(dates, navs)),
+        ('rolling_returns', n, lambda: rolling_returns.compare(dates, navs, bdates, bcloses)),
+        ('volatility_30d', n, lambda: rolling_risk.rolling_risk(
+            window_returns, windows=(analytics.VOLATILITY_WINDOW,), metrics=('volatility',))),
+        ('rolling_risk_all_windows', len(aligned), lambda: rolling_risk.rolling_risk(
+            aligned.returns, aligned.returns_of('benchmark'), windows=analytics.RISK_WINDOWS)),
+        ('drawdown_episodes', n, lambda: drawdown_episodes.find_episodes(dates, navs)),
+        ('analytics_snapshot', n, lambda: analytics.build_analytics(nav_frame, history)),
+        ('incremental_update_1_row', n, lambda: incremental_analytics.update(state, dates, navs, running_benchmark)),
+        ('align_fund_benchmark', n, lambda: aligned_returns.align({'fund': fund, 'benchmark': benchmark})),
+        ('tearsheet_metrics_1y', len(window), lambda: quant_report.report_metrics(window)),
+        ('tearsheet_metrics_full', len(aligned), lambda: quant_report.report_metrics(aligned)),
+        ('chart_downsample', n, lambda: chart_downsample.downsample(dates, navs)),
+    ]
+
+
+def universe_cases(universe, matrix_dir):
+    dates, matrix, keys = fund_compare.build_nav_matrix(universe)
+    observed = fund_compare.observed_mask(dates, universe, keys)
+    aligned = aligned_returns.align(universe, calendar='union')
+    returns = np.nan_to_num(aligned.returns[-252:])
+    benchmark = returns.mean(axis=1)
+    rows = matrix.size
+    codes = sorted(universe)
+    nav_matrix.write([universe], codes, np.unique(nav_matrix.business_days(dates)), path=matrix_dir)
+    mapped = nav_matrix.open_matrix(matrix_dir)
+    return [
+        ('nav_matrix_open', rows, lambda: nav_matrix.open_matrix(matrix_dir)),
+        ('nav_matrix_select_all', rows, lambda: mapped.select(codes)),
+        ('build_nav_matrix', rows, lambda: fund_compare.build_nav_matrix(universe)),
+        ('batch_trailing_returns', rows, lambda: period_returns.batch_trailing_returns(dates, matrix)),
+        ('compare_metrics', rows, lambda: fund_compare.compare_metrics(dates, matrix, keys, observed=observed)),
+        ('tearsheet_metrics_batch_1y', returns.size, lambda: tearsheet_metrics.headline_stats(returns, benchmark)),
+        ('rolling_risk_batch_latest', aligned.returns.size, lambda: rolling_risk.rolling_risk(
+            aligned.returns, aligned.returns.mean(axis=1), windows=analytics.RISK_WINDOWS, last=1)),
+    ]
+
+
+def search_cases(names):
+    codes = np.arange(len(names))
+    index = FundSearchIndex(codes, names)
+    counter = iter(range(10 ** 9))
+
+    def uncached():
+        # A new suffix every run so each lookup misses the query cache
+        suffix = next(counter)
+        for query in SEARCH_QUERIES:
+            index.search(f"{query} {suffix}")
+
+    return [
+        ('search_index_build', len(names), lambda: FundSearchIndex(codes, names)),
+        ('search_uncached_x%d' % len(SEARCH_QUERIES), len(names), uncached),
+        ('search_cached_x%d' % len(SEARCH_QUERIES), len(names), lambda: [index.search(q) for q in SEARCH_QUERIES]),
+    ]
+
+
+def report_cases(fund, benchmark):
+    """quantstats tearsheet for the trailing year, rendered and cached."""
+    window = aligned_returns.align({'fund': fund, 'benchmark': benchmark}).trailing(365)
+
+    def render():
+        with quant_report._cache_lock:
+            quant_report._report_cache.clear()
+        quant_report.create_report(window, "Fund", "Benchmark")
+
+    return [
+        ('create_report_render', len(window), render),
+        ('create_report_cached', len(window), lambda: quant_report.create_report(window, "Fund", "Benchmark")),
+    ]
+
+
+def run(repeat=5, include_report=True, seed=SEED, log=print):
+    datasets = {name: load_fixture(*paths) for name, paths in FIXTURES.items()}
+    datasets['synthetic_30y'] = synthetic_pair(seed=seed)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="nav_matrix_") as matrix_dir:
+        suites = [(name, pair_cases(*pair), repeat) for name, pair in datasets.items()]
+        suites.append(('universe_1000', universe_cases(synthetic_universe(seed=seed), matrix_dir), max(repeat // 2, 1)))
+        suites.append(('search_40k', search_cases(synthetic_names(seed=seed)), repeat))
+        if include_report:
+            suites.append(('report_fixture', report_cases(*datasets['fixture']), 1))
+
+        for dataset, cases, times in suites:
+            for case, rows, fn in cases:
+                timing = timed(fn, times)
+                results.append({'dataset': dataset, 'case': case, 'rows': int(rows), **timing})
+                log(f"{dataset:>16} {case:<28} {timing['median_ms']:10.2f} ms  ({rows} rows)")
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'seed': seed,
+        'results': results,
+    }
+
+
+def regressions(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Cases whose median got slower than the baseline by more than `tolerance`."""
+    before = {(r['dataset'], r['case']): r['median_ms'] for r in baseline['results']}
+    slower = []
+    for result in report['results']:
+        key = (result['dataset'], result['case'])
+        if key in before and result['median_ms'] > before[key] * (1 + tolerance):
+            slower.append({'dataset': key[0], 'case': key[1], 'baseline_ms': before[key],
+                           'median_ms': result['median_ms'], 'ratio': result['median_ms'] / before[key]})
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (median is reported)")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed for the synthetic datasets")
+    parser.add_argument("--skip-report", action="store_true", help="skip the quantstats report render")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON; exit non-zero if a case regressed")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown vs the baseline")
+    args = parser.parse_args()
+
+    log = lambda line: print(line, file=sys.stderr)
+    report = run(repeat=args.repeat, include_report=not args.skip_report, seed=args.seed, log=log)
+
+    slower = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            slower = regressions(report, json.load(fp), args.tolerance)
+        report['regressions'] = slower
+        for r in slower:
+            log(f"REGRESSION {r['dataset']} {r['case']}: {r['baseline_ms']:.2f} -> {r['median_ms']:.2f} ms")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            fp.write(output + "\n")
+    else:
+        print(output)
+    sys.exit(1 if slower else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+# Trailing horizons in calendar days, matching the app's period filters.
+# '1D' is handled separately (previous observation) and 'YTD' / 'SI' are
+# anchored on the calendar year and the first observation
+HORIZON_DAYS = {
+    '1W': 7,
+    '1M': 30,
+    '3M': 90,
+    '6M': 180,
+    '1Y': 365,
+    '3Y': 1095,
+    '5Y': 1825,
+    '10Y': 3650,
+}
+DEFAULT_HORIZONS = ('1D',) + tuple(HORIZON_DAYS) + ('YTD', 'SI')
+
+_DAY = np.timedelta64(1, 'D')
+
+
+def _as_dates(dates):
+    return np.asarray(dates).astype('datetime64[D]')
+
+
+def _year_start(date):
+    return date.astype('datetime64[Y]').astype('datetime64[D]')
+
+
+def window_start(dates, days):
+    """Index of the first observation within `days` of the last one."""
+    dates = _as_dates(dates)
+    return int(np.searchsorted(dates, dates[-1] - days * _DAY, side='left'))
+
+
+def window_bounds(dates, start_date, end_date):
+    """(lo, hi) slice bounds of the sorted `dates` between two dates inclusive."""
+    dates = _as_dates(dates)
+    lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date), 'D'), side='left')
+    hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date), 'D'), side='right')
+    return int(lo), int(hi)
+
+
+def anchor_index(dates, horizon, strict=False):
+    """Index of the observation a trailing return over `horizon` starts from.
+
+    Uses the first observation on or after the horizon start, like the
+    app always has. With `strict`, horizons longer than the available
+    history return None instead of falling back to the first observation.
+    """
+    dates = _as_dates(dates)
+    n = len(dates)
+    if n < 2:
+        return None
+    if horizon == '1D':
+        return n - 2
+    if horizon == 'SI':
+        return 0
+    if horizon == 'YTD':
+        # Return since the last close of the previous calendar year
+        idx = int(np.searchsorted(dates, _year_start(dates[-1]), side='left')) - 1
+        if idx < 0:
+            return None if strict else 0
+        return idx
+    start = dates[-1] - HORIZON_DAYS[horizon] * _DAY
+    if strict and dates[0] > start:
+        return None
+    return int(np.searchsorted(dates, start, side='left'))
+
+
+def trailing_returns(dates, values, horizons=DEFAULT_HORIZONS, strict=False):
+    """Percentage return over each horizon for one sorted series."""
+    values = np.asarray(values, dtype=np.float64)
+    result = {}
+    for horizon in horizons:
+        idx = anchor_index(dates, horizon, strict=strict)
+        result[horizon] = None if idx is None else ((values[-1] / values[idx]) - 1) * 100
+    return result
+
+
+def trailing_cagr(dates, values, horizons=DEFAULT_HORIZONS, strict=False):
+    """Annualized (compound) return for each horizon, in percent."""
+    dates = _as_dates(dates)
+    values = np.asarray(values, dtype=np.float64)
+    result = {}
+    for horizon in horizons:
+        idx = anchor_index(dates, horizon, strict=strict)
+        if idx is None:
+            result[horizon] = None
+            continue
+        years = (dates[-1] - dates[idx]) / _DAY / 365.0
+        growth = values[-1] / values[idx]
+        result[horizon] = (growth ** (1.0 / years) - 1) * 100 if years > 0 else None
+    return result
+
+
+def batch_trailing_returns(dates, matrix, horizons=DEFAULT_HORIZONS, strict=False):
+    """Trailing returns for many funds sharing one sorted date axis.
+
+    `matrix` is (dates x funds) with NaN before a fund's first NAV and
+    after its last one; gaps inside a fund's history should already be
+    forward-filled. Returns a (horizons x funds) float array, NaN where
+    a return is not available.
+    """
+    dates = _as_dates(dates)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    n, m = matrix.shape
+    valid = ~np.isnan(matrix)
+    has_data = valid.any(axis=0)
+    first = np.argmax(valid, axis=0)
+    last = n - 1 - np.argmax(valid[::-1], axis=0)
+    cols = np.arange(m)
+    latest_values = matrix[last, cols]
+    latest_dates = dates[last]
+
+    out = np.full((len(horizons), m), np.nan)
+    for row, horizon in enumerate(horizons):
+        if horizon == '1D':
+            idx = last - 1
+            ok = idx >= first
+        elif horizon == 'SI':
+            idx = first
+            ok = last > first
+        else:
+            if horizon == 'YTD':
+                idx = np.searchsorted(dates, _year_start(latest_dates), side='left') - 1
+                ok = idx >= first if strict else np.ones(m, dtype=bool)
+            else:
+                start = latest_dates - HORIZON_DAYS[horizon] * _DAY
+                idx = np.searchsorted(dates, start, side='left')
+                ok = dates[first] <= start if strict else np.ones(m, dtype=bool)
+            idx = np.maximum(idx, first)
+            ok &= last > first
+        ok &= has_data
+        idx = np.clip(idx, 0, n - 1)
+        out[row, ok] = ((latest_values[ok] / matrix[idx[ok], cols[ok]]) - 1) * 100
+    return out
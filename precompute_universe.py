@@ -0,0 +1,251 @@
+"""Offline job that syncs every scheme and builds a whole-universe metrics table.
+
+    python precompute_universe.py --workers 8
+
+Progress is checkpointed as Parquet part files in a directory of its own
+per run, so an interrupted run picks up where it left off when started
+again. A run that finishes writes the table and removes its checkpoints,
+so the next run refreshes every scheme. The memory-mapped NAV matrix
+(nav_matrix.py) is rebuilt from the synced store at the end.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+
+import benchmark_library
+import fund_list
+import incremental_analytics
+import nav_matrix
+import nav_store
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+OUTPUT_PATH = os.path.join(DATA_DIR, "universe_metrics.parquet")
+CHECKPOINT_DIR = os.path.join(DATA_DIR, "universe_parts")
+BENCHMARK = benchmark_library.DEFAULT_BENCHMARK
+# Written into each run directory: its scheme codes and whether it merges into the last table
+MANIFEST = "run.json"
+
+logger = logging.getLogger("precompute_universe")
+
+# incremental_analytics.Benchmark, set once per worker process by _init_worker
+_benchmark = None
+
+
+def _init_worker(benchmark):
+    global _benchmark
+    _benchmark = benchmark
+
+
+def _process_scheme(scheme_code):
+    row = {'scheme_code': int(scheme_code), 'error': None}
+    try:
+        conn = incremental_analytics.connect()
+        try:
+            # Sync, falling back to the stored history like nav_store.get_scheme
+            try:
+                nav_store.sync_scheme(scheme_code, conn=conn)
+            except (requests.RequestException, ValueError):
+                if nav_store.last_synced(scheme_code, conn=conn) is None:
+                    raise
+            # The stored state only has to take in the NAVs synced since the
+            # last run, so the full history is never read back
+            state = incremental_analytics.refresh_state(scheme_code, _benchmark, conn=conn)
+            meta = nav_store.load_meta(scheme_code, conn=conn) or {}
+        finally:
+            conn.close()
+        if state is None or state.count < 2:
+            row['error'] = "no NAV history"
+            return row
+        row.update({
+            'scheme_name': meta.get('scheme_name'),
+            'fund_house': meta.get('fund_house'),
+            'scheme_type': meta.get('scheme_type'),
+            'scheme_category': meta.get('scheme_category'),
+            'start_date': state.first_day.astype('datetime64[ns]'),
+            'latest_date': state.last_day.astype('datetime64[ns]'),
+            'latest_nav': float(state.navs[-1]),
+        })
+        row.update(incremental_analytics.metrics(state))
+    except Exception as e:
+        row['error'] = str(e)
+    return row
+
+
+def _process_chunk(scheme_codes):
+    return [_process_scheme(code) for code in scheme_codes]
+
+
+def unfinished_runs(checkpoint_dir):
+    """Checkpoint directories of runs that did not finish, oldest first."""
+    return sorted(glob.glob(os.path.join(checkpoint_dir, "run-*")))
+
+
+def write_manifest(run_dir, codes, merge):
+    """Record the scheme codes of a run and whether it merges into the last table."""
+    path = os.path.join(run_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"codes": [int(code) for code in codes], "merge": merge}, f)
+    os.replace(path + ".tmp", path)
+
+
+def read_manifest(run_dir):
+    """The (codes, merge) a run was started with, or None if it stopped before recording them."""
+    path = os.path.join(run_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    return manifest["codes"], manifest["merge"]
+
+
+def completed_codes(run_dir, retry_errors=False):
+    """Scheme codes already present in the checkpoint parts of a run."""
+    done = set()
+    for path in sorted(glob.glob(os.path.join(run_dir, "part-*.parquet"))):
+        part = pd.read_parquet(path, columns=['scheme_code', 'error'])
+        if retry_errors:
+            part = part[part['error'].isna()]
+        done.update(part['scheme_code'].astype(int))
+    return done
+
+
+def failed_codes(output_path):
+    """Scheme codes with an error in the last written table."""
+    if not os.path.exists(output_path):
+        return []
+    table = pd.read_parquet(output_path, columns=['scheme_code', 'error'])
+    return table.loc[table['error'].notna(), 'scheme_code'].astype(int).tolist()
+
+
+def combine_parts(run_dir, output_path, base=None):
+    """Write the parts of a run, over the rows of `base` when given, as the table."""
+    paths = sorted(glob.glob(os.path.join(run_dir, "part-*.parquet")))
+    if not paths:
+        return None
+    # Later parts (e.g. retried errors) win over earlier ones and over `base`
+    frames = ([base] if base is not None else []) + [pd.read_parquet(path) for path in paths]
+    table = pd.concat(frames, ignore_index=True)
+    table = table.drop_duplicates('scheme_code', keep='last').sort_values('scheme_code').reset_index(drop=True)
+    tmp_path = output_path + ".tmp"
+    table.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    return table
+
+
+def run(workers=None, chunk_size=100, limit=None, retry_errors=False, fresh=False,
+        benchmark=BENCHMARK, checkpoint_dir=CHECKPOINT_DIR, output_path=OUTPUT_PATH, build_matrix=True):
+    """Process the universe and write the metrics table.
+
+    An unfinished run in `checkpoint_dir` is resumed, with the schemes and
+    mode it was started with, unless `fresh`, which discards it and
+    refreshes every scheme. With `retry_errors` and no unfinished run, only
+    the schemes that failed in the last table are processed again and
+    merged into it.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    runs = unfinished_runs(checkpoint_dir)
+    if fresh:
+        for run_dir in runs:
+            shutil.rmtree(run_dir)
+        runs = []
+
+    # Resume the latest unfinished run; older ones are superseded by it, and
+    # one without a manifest stopped before it processed anything
+    manifest = read_manifest(runs[-1]) if runs else None
+    for stale in runs[:-1] if manifest else runs:
+        shutil.rmtree(stale)
+    if manifest:
+        run_dir = runs[-1]
+        # The run keeps the codes and mode it was started with, whatever the flags now
+        codes, merge = manifest
+        done = completed_codes(run_dir, retry_errors)
+        logger.info("Resuming %s", run_dir)
+    else:
+        codes = fund_list.get_fund_list().codes.tolist()
+        if limit:
+            codes = codes[:limit]
+        merge = False
+        if retry_errors:
+            failed = set(failed_codes(output_path))
+            codes = [code for code in codes if code in failed]
+            merge = bool(failed)
+        # Nanosecond run ids keep run directories in start order
+        run_dir = os.path.join(checkpoint_dir, f"run-{time.time_ns():020d}")
+        os.makedirs(run_dir)
+        write_manifest(run_dir, codes, merge)
+        done = set()
+    base = pd.read_parquet(output_path) if merge else None
+    pending = [code for code in codes if code not in done]
+    logger.info("%d schemes in this run, %d already done, %d to process", len(codes), len(codes) - len(pending), len(pending))
+
+    try:
+        history = benchmark_library.get_history(benchmark)
+        benchmark = incremental_analytics.benchmark_series(benchmark, history['date'].to_numpy(), history['close'].to_numpy())
+    except Exception as e:
+        logger.warning("Benchmark %s unavailable, alpha/beta will be empty: %s", benchmark, e)
+        benchmark = None
+
+    # Part names carry the attempt, so parts of a resumed run sort after the first attempt's
+    attempt = f"{time.time_ns():020d}"
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    processed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(benchmark,)) as pool:
+        futures = {pool.submit(_process_chunk, chunk): i for i, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            rows = future.result()
+            # Each finished chunk is its own checkpoint
+            part_path = os.path.join(run_dir, f"part-{attempt}-{futures[future]:05d}.parquet")
+            pd.DataFrame(rows).to_parquet(part_path, index=False)
+            processed += len(rows)
+            logger.info("%d/%d schemes processed", processed, len(pending))
+
+    table = combine_parts(run_dir, output_path, base)
+    if table is not None:
+        logger.info("Wrote %d schemes (%d with errors) to %s", len(table), table['error'].notna().sum(), output_path)
+    # The run is finished: the next one starts over and refreshes every scheme
+    shutil.rmtree(run_dir)
+    if build_matrix:
+        nav_matrix.build()
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="schemes per checkpoint part")
+    parser.add_argument("--limit", type=int, default=None, help="only process the first N schemes")
+    parser.add_argument("--retry-errors", action="store_true",
+                        help="only reprocess schemes that failed in the last run")
+    parser.add_argument("--fresh", action="store_true",
+                        help="discard the checkpoints of an unfinished run instead of resuming it")
+    parser.add_argument("--benchmark", default=BENCHMARK, choices=sorted(benchmark_library.BENCHMARKS),
+                        help="library benchmark for alpha/beta")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--skip-matrix", action="store_true", help="do not rebuild the memory-mapped NAV matrix")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    run(
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        limit=args.limit,
+        retry_errors=args.retry_errors,
+        fresh=args.fresh,
+        benchmark=args.benchmark,
+        checkpoint_dir=args.checkpoint_dir,
+        output_path=args.output,
+        build_matrix=not args.skip_matrix,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,107 @@
-import json
-from pprint import pprint
-from datetime import datetime
-import pandas as pd
-
-import matplotlib.pyplot as plt
-import yfinance as yf
-import quantstats as qs
-
-import logging
-logging.getLogger('matplotlib.font_manager').setLevel(level=logging.CRITICAL)
-import warnings
-warnings.filterwarnings('ignore')
-
-def create_report(fund_df, benchmark_df, fund_name, benchmark_name,temp_file_name):
-    
-    fund_data = fund_df[['date','nav']].copy()
-    benchmark_data = benchmark_df[['date','close']].copy()
-    fund_data['date'] = pd.to_datetime(fund_data['date'])
-    benchmark_data['date'] = pd.to_datetime(benchmark_data['date'])
-    
-
-    #fund_data = pd.read_csv("fund_data.csv", parse_dates=['date'])
-    #benchmark_data = pd.read_csv("benchmark_data.csv", parse_dates=['date'])
-    #fund_data['Date'] = pd.to_datetime(df['Date'])
-    fund_data = fund_data.set_index(['date'], drop=True)
-    benchmark_data = benchmark_data.set_index(['date'], drop=True)
-    # Get common dates using index intersection
-    common_dates = fund_data.index.intersection(benchmark_data.index)
-    # Filter both dataframes to keep only common dates
-    fund_data = fund_data.loc[common_dates]
-    benchmark_data = benchmark_data.loc[common_dates]
-    #fund_data.to_csv("test_fund_data.csv")
-    fund_data = fund_data.pct_change().dropna()
-    fund_data = fund_data.iloc[:,0] # convert to series
-
-    benchmark_data = benchmark_data.pct_change().dropna()
-    benchmark_data = benchmark_data.iloc[:,0] # convert to series
-
-    # Verify they have same shape now
-    #print("Fund data shape:", fund_data.shape)
-    #print("Benchmark data shape:", benchmark_data.shape)
-    qs.reports.html(fund_data, benchmark_data,
-                    title=fund_name,
-                    benchmark_title=benchmark_name,
-                    strategy_title=fund_name,
-                    #download_filename=f'{fund_df.name}.html',
-                    #output=f'{fund_name}.html'
-                    output=temp_file_name
-                    )
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
 
+import instrumentation
+import tearsheet_metrics
+
+# quantstats and matplotlib are slow to import and only needed for the full
+# HTML report, so they are loaded on the first render (see _load_quantstats)
+_qs = None
+_plt = None
+
+# Rendered reports keyed by a digest of their inputs, shared by all sessions
+REPORT_CACHE_SIZE = 32
+_report_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# pyplot keeps global figure state, so renders within a process are serialized
+_render_lock = threading.Lock()
+
+# quantstats can only write the report to a path; use memory-backed /dev/shm
+# for the short-lived scratch file where the platform has it
+_SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def report_returns(aligned):
+    """Fund and benchmark daily returns of an aligned window as Series."""
+    return aligned.return_series('fund'), aligned.return_series('benchmark')
+
+
+def report_key(fund_returns, benchmark_returns, fund_name, benchmark_name):
+    # Content address: same names, dates and returns give the same report
+    digest = hashlib.sha256()
+    for name in (fund_name, benchmark_name):
+        digest.update(name.encode('utf-8') + b'\0')
+    for series in (fund_returns, benchmark_returns):
+        digest.update(series.index.values.astype('datetime64[ns]').tobytes())
+        digest.update(series.to_numpy(dtype='float64').tobytes())
+    return digest.hexdigest()
+
+
+def _load_quantstats():
+    global _qs, _plt
+    if _qs is None:
+        import logging
+        import warnings
+        import matplotlib.pyplot as plt
+        import quantstats as qs
+        logging.getLogger('matplotlib.font_manager').setLevel(level=logging.CRITICAL)
+        warnings.filterwarnings('ignore')
+        _qs, _plt = qs, plt
+    return _qs, _plt
+
+
+def report_metrics(aligned):
+    """Headline tear-sheet statistics without rendering the full report."""
+    return tearsheet_metrics.headline_stats(
+        aligned.returns_of('fund'), aligned.returns_of('benchmark'), dates=aligned.dates[1:]
+    )
+
+
+def render_report(fund_returns, benchmark_returns, fund_name, benchmark_name):
+    """Render the tearsheet HTML for already aligned daily returns."""
+    qs, plt = _load_quantstats()
+    with tempfile.TemporaryDirectory(dir=_SCRATCH_DIR) as scratch_dir:
+        output = os.path.join(scratch_dir, "report.html")
+        with _render_lock:
+            qs.reports.html(fund_returns, benchmark_returns,
+                            title=fund_name,
+                            benchmark_title=benchmark_name,
+                            strategy_title=fund_name,
+                            output=output
+                            )
+            plt.close('all')
+        with open(output, "r", encoding="utf-8") as fp:
+            return fp.read()
+
+
+def cached_report(key):
+    with _cache_lock:
+        if key in _report_cache:
+            _report_cache.move_to_end(key)
+            return _report_cache[key]
+    return None
+
+
+def store_report(key, html):
+    with _cache_lock:
+        _report_cache[key] = html
+        if len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+
+
+def create_report(aligned, fund_name, benchmark_name):
+    """Return the quantstats HTML tearsheet for an aligned fund/benchmark window."""
+    fund_returns, benchmark_returns = report_returns(aligned)
+    key = report_key(fund_returns, benchmark_returns, fund_name, benchmark_name)
+
+    html = cached_report(key)
+    instrumentation.count_cache("report", hit=html is not None)
+    if html is None:
+        with instrumentation.span("report.render", rows=len(fund_returns)):
+            html = render_report(fund_returns, benchmark_returns, fund_name, benchmark_name)
+        store_report(key, html)
+    return html
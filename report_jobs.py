@@ -0,0 +1,214 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+
+import instrumentation
+import quant_report
+
+# Worker processes rendering reports; each has its own matplotlib state, so
+# renders for different users run in parallel without interfering
+MAX_WORKERS = 2
+# Finished jobs kept around for polling before they are forgotten
+JOB_RETENTION_SECONDS = 3600
+# Initial guess of a render's duration, refined from completed jobs
+DEFAULT_RENDER_SECONDS = 8.0
+
+_executor = None
+_executor_lock = threading.Lock()
+# Workers put (token, wall-clock time) here when they start a render, since
+# a future counts as running as soon as it is queued for a worker
+_started = None
+_jobs = {}
+_jobs_lock = threading.Lock()
+_render_seconds = []
+_tokens = itertools.count()
+
+# In a worker process: the queue start times are reported on
+_worker_started = None
+
+
+@dataclass
+class ReportJob:
+    job_id: str
+    fund_name: str
+    benchmark_name: str
+    future: object = None
+    submitted_at: float = field(default_factory=time.monotonic)
+    started_at: float = None
+    finished_at: float = None
+    cancelled: bool = False
+    # Sessions waiting for the job; it is only cancelled once none is left
+    subscribers: set = field(default_factory=set)
+    # Matches a worker's start report to this submission of the job id
+    token: int = field(default_factory=lambda: next(_tokens))
+
+
+def _init_worker(started):
+    global _worker_started
+    _worker_started = started
+
+
+def _render(token, *args):
+    _worker_started.put((token, time.time()))
+    return quant_report.render_report(*args)
+
+
+def _get_executor():
+    global _executor, _started
+    with _executor_lock:
+        if _executor is None:
+            # spawn rather than fork: the Streamlit server process is threaded
+            context = multiprocessing.get_context("spawn")
+            _started = context.Queue()
+            _executor = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS, mp_context=context, initializer=_init_worker, initargs=(_started,)
+            )
+        return _executor
+
+
+def _collect_started():
+    """Record the start times workers have reported since the last poll."""
+    started = _started
+    if started is None:
+        return
+    while True:
+        try:
+            token, wall = started.get_nowait()
+        except (queue.Empty, OSError, ValueError):
+            return
+        with _jobs_lock:
+            for job in _jobs.values():
+                if job.token == token and job.started_at is None:
+                    job.started_at = time.monotonic() - max(time.time() - wall, 0.0)
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _expected_seconds():
+    recent = _render_seconds[-20:]
+    return sum(recent) / len(recent) if recent else DEFAULT_RENDER_SECONDS
+
+
+def _on_done(job, future):
+    job.finished_at = time.monotonic()
+    if future.cancelled() or future.exception() is not None:
+        return
+    started = job.started_at or job.submitted_at
+    _render_seconds.append(job.finished_at - started)
+    # Rendered in a worker process, so timed here from submission to result
+    instrumentation.record("report.job", job.finished_at - job.submitted_at, job=job.job_id[:12])
+    # Results are cached even for jobs cancelled while running
+    quant_report.store_report(job.job_id, future.result())
+
+
+def _prune():
+    now = time.monotonic()
+    for job_id, job in list(_jobs.items()):
+        if job.finished_at is not None and now - job.finished_at > JOB_RETENTION_SECONDS:
+            del _jobs[job_id]
+
+
+def submit_report(aligned, fund_name, benchmark_name, subscriber=None):
+    """Queue a report render for an aligned fund/benchmark window on
+    behalf of `subscriber` (e.g. a session id) and return its job id.
+
+    The job id is the report's content key, so identical requests from
+    several sessions share one job and a cached report completes at once.
+    """
+    fund_returns, benchmark_returns = quant_report.report_returns(aligned)
+    job_id = quant_report.report_key(fund_returns, benchmark_returns, fund_name, benchmark_name)
+
+    with _jobs_lock:
+        _prune()
+        job = _jobs.get(job_id)
+        if job is not None and not job.cancelled and not (job.future and job.future.cancelled()):
+            job.subscribers.add(subscriber)
+            return job_id
+        job = ReportJob(job_id=job_id, fund_name=fund_name, benchmark_name=benchmark_name, subscribers={subscriber})
+        _jobs[job_id] = job
+        cached = quant_report.cached_report(job_id) is not None
+        instrumentation.count_cache("report", hit=cached)
+        if cached:
+            job.finished_at = time.monotonic()
+            return job_id
+        args = (_render, job.token, fund_returns, benchmark_returns, fund_name, benchmark_name)
+        try:
+            job.future = _get_executor().submit(*args)
+        except BrokenProcessPool:
+            # A crashed worker breaks the whole pool; start a fresh one
+            _reset_executor()
+            job.future = _get_executor().submit(*args)
+    job.future.add_done_callback(lambda future: _on_done(job, future))
+    return job_id
+
+
+def job_status(job_id, subscriber=None):
+    """Poll a job as `subscriber` sees it: {'status', 'progress' (0-1),
+    'elapsed', 'error'}."""
+    _collect_started()
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return {'status': 'unknown', 'progress': 0.0, 'elapsed': 0.0, 'error': None}
+
+    now = time.monotonic()
+    future = job.future
+    elapsed = (job.finished_at or now) - job.submitted_at
+    if job.cancelled or subscriber not in job.subscribers or (future is not None and future.cancelled()):
+        return {'status': 'cancelled', 'progress': 0.0, 'elapsed': elapsed, 'error': None}
+    if future is None or future.done():
+        error = future.exception() if future is not None else None
+        if error is not None:
+            return {'status': 'failed', 'progress': 1.0, 'elapsed': elapsed, 'error': str(error)}
+        return {'status': 'done', 'progress': 1.0, 'elapsed': elapsed, 'error': None}
+    if job.started_at is not None:
+        # quantstats reports no progress of its own; estimate from past renders
+        progress = min((now - job.started_at) / _expected_seconds(), 0.95)
+        return {'status': 'running', 'progress': progress, 'elapsed': elapsed, 'error': None}
+    return {'status': 'queued', 'progress': 0.0, 'elapsed': elapsed, 'error': None}
+
+
+def job_result(job_id, subscriber=None):
+    """The rendered HTML once a job is done, otherwise None."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None or job.cancelled or subscriber not in job.subscribers:
+        return None
+    html = quant_report.cached_report(job_id)
+    if html is None and job.future is not None and job.future.done():
+        try:
+            html = job.future.result()
+        except (CancelledError, Exception):
+            return None
+    return html
+
+
+def cancel_job(job_id, subscriber=None):
+    """Withdraw `subscriber` from a job; the job itself is cancelled once
+    no subscriber is left. Queued jobs never start; a render already in
+    progress runs to completion in its worker but the job reports as
+    cancelled."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return False
+        job.subscribers.discard(subscriber)
+        if job.subscribers:
+            return True
+        job.cancelled = True
+        if job.future is not None:
+            job.future.cancel()
+        if job.finished_at is None:
+            job.finished_at = time.monotonic()
+    return True
@@ -0,0 +1,117 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# Rolling windows in calendar months
+ROLLING_WINDOWS = {
+    '1M': 1,
+    '3M': 3,
+    '6M': 6,
+    '1Y': 12,
+    '3Y': 36,
+    '5Y': 60,
+    '10Y': 120,
+}
+# Windows of at least this many months are reported as annualized CAGR
+ANNUALIZE_FROM_MONTHS = 12
+
+
+def _as_dates(dates):
+    return np.asarray(dates).astype('datetime64[D]')
+
+
+def shift_months(dates, months):
+    """Same calendar day `months` earlier, clamped to the end of shorter months."""
+    dates = _as_dates(dates)
+    month = dates.astype('datetime64[M]')
+    day = (dates - month.astype('datetime64[D]')).astype(np.int64)
+    target = month - months
+    month_len = ((target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')).astype(np.int64)
+    return target.astype('datetime64[D]') + np.minimum(day, month_len - 1)
+
+
+def window_anchors(dates, months):
+    """Index of the last observation on or before each date minus `months`
+    (-1 where the history does not reach back that far)."""
+    dates = _as_dates(dates)
+    return np.searchsorted(dates, shift_months(dates, months), side='right') - 1
+
+
+def rolling_return(dates, values, months, annualize=None):
+    """Calendar-window rolling return in percent for one sorted series."""
+    values = np.asarray(values, dtype=np.float64)
+    anchors = window_anchors(dates, months)
+    out = np.full(len(values), np.nan)
+    ok = anchors >= 0
+    growth = values[ok] / values[anchors[ok]]
+    if annualize is None:
+        annualize = months >= ANNUALIZE_FROM_MONTHS
+    if annualize:
+        growth = growth ** (12.0 / months)
+    out[ok] = (growth - 1) * 100
+    return out
+
+
+@dataclass(frozen=True)
+class RollingComparison:
+    """Fund and benchmark rolling returns on the dates both series share."""
+    dates: np.ndarray
+    windows: tuple
+    fund: dict = field(default_factory=dict)
+    benchmark: dict = field(default_factory=dict)
+
+    @property
+    def has_benchmark(self):
+        return bool(self.benchmark)
+
+    def summary(self):
+        """Distribution of rolling returns per window as a DataFrame."""
+        rows = []
+        for window in self.windows:
+            fund = self.fund[window]
+            row = {'Window': window, 'Observations': int(np.count_nonzero(~np.isnan(fund)))}
+            if row['Observations'] == 0:
+                continue
+            row.update({
+                'Fund Min': np.nanmin(fund),
+                'Fund Median': np.nanmedian(fund),
+                'Fund Max': np.nanmax(fund),
+            })
+            if self.has_benchmark:
+                benchmark = self.benchmark[window]
+                both = ~np.isnan(fund) & ~np.isnan(benchmark)
+                row['Observations'] = int(both.sum())
+                if row['Observations'] == 0:
+                    continue
+                outperformance = fund[both] - benchmark[both]
+                row.update({
+                    'Benchmark Min': benchmark[both].min(),
+                    'Benchmark Median': np.median(benchmark[both]),
+                    'Benchmark Max': benchmark[both].max(),
+                    'Beats Benchmark (%)': (outperformance > 0).mean() * 100,
+                    'Avg Outperformance': outperformance.mean(),
+                })
+            rows.append(row)
+        return pd.DataFrame(rows).set_index('Window') if rows else pd.DataFrame()
+
+
+def compare(fund_dates, fund_values, benchmark_dates=None, benchmark_values=None, windows=tuple(ROLLING_WINDOWS)):
+    """Rolling returns for a fund (and optionally a benchmark) for every window.
+
+    Each series is windowed on its own calendar before both are reduced to
+    their common dates, so a missing benchmark day never shifts the fund's
+    anchors and vice versa.
+    """
+    fund_dates = _as_dates(fund_dates)
+    fund = {w: rolling_return(fund_dates, fund_values, ROLLING_WINDOWS[w]) for w in windows}
+    if benchmark_dates is None or len(benchmark_dates) == 0:
+        return RollingComparison(dates=fund_dates, windows=tuple(windows), fund=fund)
+
+    benchmark_dates = _as_dates(benchmark_dates)
+    dates, fund_idx, bench_idx = np.intersect1d(fund_dates, benchmark_dates, assume_unique=True, return_indices=True)
+    benchmark = {}
+    for w in windows:
+        fund[w] = fund[w][fund_idx]
+        benchmark[w] = rolling_return(benchmark_dates, benchmark_values, ROLLING_WINDOWS[w])[bench_idx]
+    return RollingComparison(dates=dates, windows=tuple(windows), fund=fund, benchmark=benchmark)
@@ -0,0 +1,123 @@
+"""Rolling risk metrics for several windows from one set of prefix sums.
+
+Prefix sums of returns, squared returns, squared downside returns and, with
+a benchmark, benchmark returns and cross products are taken in one pass;
+the sum over any window is then the difference of two rows, so each
+metric costs the same for a 30-day as for a 3-year window. Returns are
+daily simple returns, 1-D for one fund or (periods x funds) for a batch
+such as a whole category, with NaN where a fund has no return. A window
+containing a NaN gives NaN.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+# Window lengths in trading days
+WINDOWS = {
+    '30D': 30,
+    '1M': 21,
+    '3M': 63,
+    '6M': 126,
+    '1Y': 252,
+    '3Y': 756,
+}
+METRICS = ('volatility', 'downside_deviation', 'sharpe', 'sortino', 'beta', 'tracking_error')
+# Metrics that need the benchmark
+RELATIVE_METRICS = ('beta', 'tracking_error')
+TRADING_DAYS = 252
+
+
+@dataclass(frozen=True)
+class RollingRisk:
+    """Rolling metrics as {(metric, window): (rows x funds) array}.
+
+    `rows` are the positions in the input returns each output row ends at;
+    volatility, downside deviation and tracking error are annualized
+    percentages, Sharpe and Sortino annualized ratios.
+    """
+    rows: np.ndarray
+    windows: tuple
+    values: dict
+
+    def get(self, metric, window, column=0):
+        return self.values[(metric, window)][:, column]
+
+
+def _prefix(values):
+    out = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=out[1:])
+    return out
+
+
+def rolling_risk(returns, benchmark=None, windows=('30D', '3M', '6M', '1Y'), metrics=METRICS,
+                 rf=0.0, periods=TRADING_DAYS, last=None):
+    """Rolling metrics of `returns` for every window in one pass.
+
+    `benchmark` holds the benchmark's returns on the same rows and is
+    needed for beta and tracking error. With `last`, only the windows
+    ending on the last `last` rows are computed, reading just the rows
+    those windows cover, which is what batch use over many funds wants.
+    """
+    need = set(metrics)
+    if need & set(RELATIVE_METRICS) and benchmark is None:
+        raise ValueError("beta and tracking error need a benchmark")
+    r = np.asarray(returns, dtype=np.float64)
+    r = r.reshape(-1, 1) if r.ndim == 1 else r
+    n_rows = len(r)
+    rows = np.arange(n_rows) if last is None else np.arange(max(n_rows - last, 0), n_rows)
+    # Rows before the first window of the first output row are never read
+    offset = max(rows[0] - max(WINDOWS[w] for w in windows) + 1, 0) if len(rows) else n_rows
+    r = r[offset:]
+    valid = ~np.isnan(r)
+    if benchmark is not None:
+        b = np.asarray(benchmark, dtype=np.float64)[offset:]
+        valid &= ~np.isnan(b).reshape(-1, 1)
+        b = np.where(np.isnan(b), 0.0, b)
+    r = np.where(valid, r, 0.0)
+    rf_daily = rf / periods
+
+    # One prefix sum per statistic the requested metrics use, shared by every window
+    count = _prefix(valid.astype(np.float64))
+    s1 = _prefix(r)
+    if need & {'volatility', 'sharpe', 'tracking_error'}:
+        s2 = _prefix(r * r)
+    if need & {'downside_deviation', 'sortino'}:
+        sd = _prefix(np.where(valid, np.minimum(r - rf_daily, 0.0), 0.0) ** 2)
+    if need & set(RELATIVE_METRICS):
+        sb, sb2 = _prefix(b)[:, None], _prefix(b * b)[:, None]
+        srb = _prefix(r * b[:, None])
+
+    scale = np.sqrt(periods)
+    values = {}
+    for window in windows:
+        n = WINDOWS[window]
+        ends = rows[rows >= n - 1]
+        hi, lo = ends + 1 - offset, ends + 1 - n - offset
+        full = (count[hi] - count[lo]) == n
+        total = s1[hi] - s1[lo]
+        mean = total / n
+        results = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if need & {'volatility', 'sharpe'}:
+                std = np.sqrt(np.maximum((s2[hi] - s2[lo] - total * mean) / (n - 1), 0.0))
+                results['volatility'] = std * scale * 100
+                results['sharpe'] = (mean - rf_daily) / std * scale
+            if need & {'downside_deviation', 'sortino'}:
+                downside = np.sqrt((sd[hi] - sd[lo]) / n)
+                results['downside_deviation'] = downside * scale * 100
+                results['sortino'] = (mean - rf_daily) / downside * scale
+            if need & set(RELATIVE_METRICS):
+                b_total = sb[hi] - sb[lo]
+                cross = srb[hi] - srb[lo]
+                results['beta'] = (cross - total * b_total / n) / (sb2[hi] - sb2[lo] - b_total * b_total / n)
+                if 'tracking_error' in need:
+                    active = total - b_total
+                    active_squares = (s2[hi] - s2[lo]) - 2 * cross + (sb2[hi] - sb2[lo])
+                    results['tracking_error'] = np.sqrt(np.maximum(
+                        (active_squares - active * active / n) / (n - 1), 0.0
+                    )) * scale * 100
+        for metric in metrics:
+            out = np.full((len(rows), r.shape[1]), np.nan)
+            out[len(rows) - len(ends):] = np.where(full, results[metric], np.nan)
+            values[(metric, window)] = out
+    return RollingRisk(rows=rows, windows=tuple(windows), values=values)
@@ -0,0 +1,105 @@
+"""Measure the import cost of the Streamlit entry point against a budget.
+
+    python startup_benchmark.py --budget-ms 2500
+
+Runs the app's top-level imports in a fresh interpreter with
+`-X importtime`, prints the slowest modules, and exits non-zero when the
+total is over budget or a module that should load lazily was imported.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mutual-fund-analyzer.py")
+# Total import time allowed for a cold start, streamlit and pandas included
+BUDGET_MS = 2500
+# Heavy dependencies that must only load when a feature needs them.
+# plotly.graph_objects is absent because streamlit itself imports it
+LAZY_MODULES = ('quantstats', 'matplotlib', 'yfinance', 'scipy', 'plotly.express')
+
+
+def entry_imports(path=APP_PATH):
+    """Source of the module-level import statements of the entry point."""
+    with open(path, encoding="utf-8") as fp:
+        tree = ast.parse(fp.read(), filename=path)
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(imports, cwd=None):
+    """Import `imports` in a fresh interpreter; returns (importtime rows, loaded lazy modules)."""
+    probe = imports + (
+        "\nimport sys, json"
+        f"\nprint(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        capture_output=True, text=True, cwd=cwd, check=True
+    )
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return parse_importtime(result.stderr), loaded
+
+
+def run(budget_ms=BUDGET_MS, repeat=3, top=15, app_path=APP_PATH):
+    imports = entry_imports(app_path)
+    runs = [measure(imports, cwd=os.path.dirname(app_path)) for _ in range(repeat)]
+    totals = [sum(row[1] for row in rows) / 1000 for rows, _ in runs]
+    # Breakdown from the fastest run, the one least disturbed by noise
+    rows, loaded = runs[totals.index(min(totals))]
+    top_level = sorted((row for row in rows if row[3] == 0), key=lambda row: -row[2])
+    return {
+        'total_ms': statistics.median(totals),
+        'min_ms': min(totals),
+        'budget_ms': budget_ms,
+        'top_level': [{'module': name, 'cumulative_ms': cumulative / 1000} for name, _, cumulative, _ in top_level[:top]],
+        'slowest_self': [
+            {'module': name, 'self_ms': self_us / 1000}
+            for name, self_us, _, _ in sorted(rows, key=lambda row: -row[1])[:top]
+        ],
+        'lazy_modules_loaded': loaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="allowed total import time")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters to time (median is reported)")
+    parser.add_argument("--top", type=int, default=15, help="modules to list")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(budget_ms=args.budget_ms, repeat=args.repeat, top=args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Startup imports: {report['total_ms']:.0f} ms median (budget {report['budget_ms']:.0f} ms)")
+        print("\nTop-level imports (cumulative):")
+        for row in report['top_level']:
+            print(f"  {row['cumulative_ms']:8.1f} ms  {row['module']}")
+        print("\nSlowest modules (self):")
+        for row in report['slowest_self']:
+            print(f"  {row['self_ms']:8.1f} ms  {row['module']}")
+        if report['lazy_modules_loaded']:
+            print(f"\nLoaded at startup but should be lazy: {', '.join(report['lazy_modules_loaded'])}")
+
+    failed = report['total_ms'] > report['budget_ms'] or report['lazy_modules_loaded']
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
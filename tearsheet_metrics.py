@@ -0,0 +1,169 @@
+"""Headline tear-sheet statistics computed directly with NumPy.
+
+Every function takes daily simple returns as a 1-D array (one fund) or a
+2-D (periods x funds) array, plus the benchmark's returns on the same
+dates, and works column-wise. Returns must be aligned and free of NaNs,
+as held by aligned_returns.AlignedReturns. With fewer than two
+observations every statistic is NaN.
+"""
+import numpy as np
+
+PERIODS_PER_YEAR = 252
+# Fewest returns any statistic is computed from
+MIN_OBSERVATIONS = 2
+
+
+def _as_matrix(returns):
+    returns = np.asarray(returns, dtype=np.float64)
+    return returns.reshape(-1, 1) if returns.ndim == 1 else returns
+
+
+def _years(n, dates=None, periods=PERIODS_PER_YEAR):
+    # Calendar years when dates are known, like the CAGR elsewhere in the app;
+    # quantstats counts observations / periods instead, which drifts for NAVs
+    # published on fewer than 252 days a year
+    if dates is not None and len(dates) > 1:
+        dates = np.asarray(dates).astype('datetime64[D]')
+        return (dates[-1] - dates[0]) / np.timedelta64(1, 'D') / 365.0
+    return n / periods
+
+
+def _squeeze(values, returns):
+    return values[0] if np.asarray(returns).ndim == 1 else values
+
+
+def _too_short(r):
+    return len(r) < MIN_OBSERVATIONS
+
+
+def _nan(r, returns):
+    return _squeeze(np.full(r.shape[1], np.nan), returns)
+
+
+def cagr(returns, dates=None, periods=PERIODS_PER_YEAR):
+    r = _as_matrix(returns)
+    if _too_short(r):
+        return _nan(r, returns)
+    growth = np.prod(1 + r, axis=0)
+    years = _years(len(r), dates, periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = growth ** (1.0 / years) - 1 if years > 0 else np.full(r.shape[1], np.nan)
+    return _squeeze(value, returns)
+
+
+def sharpe(returns, rf=0.0, periods=PERIODS_PER_YEAR):
+    excess = _as_matrix(returns) - rf / periods
+    if _too_short(excess):
+        return _nan(excess, returns)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = excess.mean(axis=0) / excess.std(axis=0, ddof=1) * np.sqrt(periods)
+    return _squeeze(value, returns)
+
+
+def sortino(returns, rf=0.0, periods=PERIODS_PER_YEAR):
+    excess = _as_matrix(returns) - rf / periods
+    if _too_short(excess):
+        return _nan(excess, returns)
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2, axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = excess.mean(axis=0) / downside * np.sqrt(periods)
+    return _squeeze(value, returns)
+
+
+def drawdowns(returns):
+    """Drawdown series of the compounded returns, starting from a value of 1."""
+    wealth = np.cumprod(1 + _as_matrix(returns), axis=0)
+    peaks = np.maximum(np.maximum.accumulate(wealth, axis=0), 1.0)
+    return wealth / peaks - 1
+
+
+def max_drawdown(returns):
+    dd = drawdowns(returns)
+    if _too_short(dd):
+        return _nan(dd, returns)
+    return _squeeze(dd.min(axis=0), returns)
+
+
+def max_drawdown_duration(returns, dates=None):
+    """Longest time spent below a previous peak, in days when `dates` are
+    given and in periods otherwise."""
+    dd = drawdowns(returns)
+    if _too_short(dd):
+        return _nan(dd, returns)
+    n = len(dd)
+    idx = np.arange(n).reshape(-1, 1)
+    # Index of the latest peak at or before every row (-1 before the first)
+    last_peak = np.maximum.accumulate(np.where(dd >= 0, idx, -1), axis=0)
+    if dates is not None:
+        days = (np.asarray(dates).astype('datetime64[D]') - np.asarray(dates[0]).astype('datetime64[D]'))
+        days = (days / np.timedelta64(1, 'D')).reshape(-1, 1)
+        # Before the first peak, count from the start of the series
+        start = np.where(last_peak >= 0, days[np.maximum(last_peak, 0), 0], days[0, 0])
+        duration = days - start
+    else:
+        duration = idx - np.maximum(last_peak, 0)
+    return _squeeze(duration.max(axis=0), returns)
+
+
+def calmar(returns, dates=None, periods=PERIODS_PER_YEAR):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = np.atleast_1d(cagr(returns, dates, periods)) / np.abs(np.atleast_1d(max_drawdown(returns)))
+    return _squeeze(value, returns)
+
+
+def greeks(returns, benchmark, periods=PERIODS_PER_YEAR):
+    """(alpha, beta) from a regression on benchmark returns; alpha annualized."""
+    r = _as_matrix(returns)
+    if _too_short(r):
+        return _nan(r, returns), _nan(r, returns)
+    b = np.asarray(benchmark, dtype=np.float64)
+    b_centered = b - b.mean()
+    variance = b_centered @ b_centered / (len(b) - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = (b_centered @ (r - r.mean(axis=0))) / (len(b) - 1) / variance
+    alpha = (r.mean(axis=0) - beta * b.mean()) * periods
+    return _squeeze(alpha, returns), _squeeze(beta, returns)
+
+
+def information_ratio(returns, benchmark):
+    # Not annualized, matching quantstats
+    active = _as_matrix(returns) - np.asarray(benchmark, dtype=np.float64).reshape(-1, 1)
+    if _too_short(active):
+        return _nan(active, returns)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = active.mean(axis=0) / active.std(axis=0, ddof=1)
+    return _squeeze(value, returns)
+
+
+def capture_ratios(returns, benchmark):
+    """(up capture, down capture): the fund's average return on days the
+    benchmark rose (fell) relative to the benchmark's average on those days."""
+    r = _as_matrix(returns)
+    if _too_short(r):
+        return _nan(r, returns), _nan(r, returns)
+    b = np.asarray(benchmark, dtype=np.float64)
+    up, down = b > 0, b < 0
+    nan = np.full(r.shape[1], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        up_capture = r[up].mean(axis=0) / b[up].mean() if up.any() else nan
+        down_capture = r[down].mean(axis=0) / b[down].mean() if down.any() else nan
+    return _squeeze(up_capture, returns), _squeeze(down_capture, returns)
+
+
+def headline_stats(returns, benchmark, dates=None, rf=0.0, periods=PERIODS_PER_YEAR):
+    """All headline statistics as {name: value (or array for several funds)}."""
+    alpha, beta = greeks(returns, benchmark, periods)
+    up_capture, down_capture = capture_ratios(returns, benchmark)
+    return {
+        'CAGR': cagr(returns, dates, periods),
+        'Sharpe': sharpe(returns, rf, periods),
+        'Sortino': sortino(returns, rf, periods),
+        'Calmar': calmar(returns, dates, periods),
+        'Max Drawdown': max_drawdown(returns),
+        'Max Drawdown Duration': max_drawdown_duration(returns, dates),
+        'Alpha': alpha,
+        'Beta': beta,
+        'Information Ratio': information_ratio(returns, benchmark),
+        'Up Capture': up_capture,
+        'Down Capture': down_capture,
+    }